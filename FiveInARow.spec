@@ -5,7 +5,7 @@ a = Analysis(
     ['tictactoe.py'],
     pathex=[],
     binaries=[],
-    datas=[('sounds', 'sounds')],
+    datas=[('sounds', 'sounds'), ('opening_book.bin', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -2,377 +2,775 @@ import math
 import time
 import random
 
+from bitboard import BitBoard, WIN_CONSEC, STONES, EMPTY, X_STONE, ZOBRIST_SIDE
+from patterns import FIVE, OPEN_FOUR, FOUR, OPEN_THREE
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from threats import find_forced_win, clear_cache as clear_threat_cache
+from book import probe as probe_book
+
 # --- AI Configuration (Global Constants) ---
-# These should match the constants in your main file
-WIN_CONSEC = 5 # 5 in a row to win
+# WIN_CONSEC (5 in a row to win) lives in bitboard.py and is re-exported here
+TT_MEMORY_MB = 64 # Memory cap for the transposition table
+ASPIRATION_WINDOW = 20000 # Initial half-width of the window around the previous depth's score
+ASPIRATION_LIMIT = 1000000 # Past this half-width a failing side of the window is opened fully
+MAX_MOVES = 12 # Moves searched at each node more than 2 plies above the leaves
+MAX_MOVES_SHALLOW = 8 # ... and at the last 2 plies
+DEFENSE_WEIGHT = 1.5 # The opponent's score counts this much more than the AI's own, in evaluate_board and move ordering
+MULTI_THREAT_BONUS = 500000 # Added for two or more strong threats (double-three, four-three)
+QUIESCENCE_DEPTH = 4 # Forcing plies searched past the nominal depth when a four or live three is on the board
+QUIESCENCE_MOVES = 4 # Forcing moves tried at each of those plies
+
+# --- Time Management ---
+TIME_CHECK_NODES = 64 # Nodes between clock checks inside the search
+TIME_SAFETY_MARGIN = 0.05 # Seconds kept back for unwinding the search and returning the move
+EXPECTED_MOVES_LEFT = 30 # Own moves the game clock is spread over at the start of a game
+MIN_MOVES_LEFT = 10 # ... never fewer than this, however long the game has gone on
+SOFT_TIME_FRACTION = 0.5 # No new depth is started after this share of the move's budget
+STABLE_TIME_FRACTION = 0.25 # ... or after this share once the best move has held for STABLE_DEPTHS depths
+STABLE_DEPTHS = 2
+
+# Transposition table shared by consecutive AI moves (global to the module)
+_tt = TranspositionTable(TT_MEMORY_MB)
+
+# Nodes visited by minimax_optimized since the last reset_node_count()
+_node_count = 0
+
+class SearchCancelled(Exception):
+    """Raised inside the search when its cancellation token is set."""
+
+
+class SearchClock:
+    """
+    Cancel token for one search with a time budget. It is set when the outside
+    token (e.g. from AISearch) is set, or once the budget has run out; the clock
+    is only read every TIME_CHECK_NODES calls. While pondering (see
+    ai_worker.Ponder) the budget only starts counting at the ponder hit.
+    """
+
+    def __init__(self, budget, cancel=None, ponder=None):
+        self.budget = budget
+        self.cancel = cancel
+        self.ponder = ponder
+        self.start = time.time()
+        self.expired = False
+        self._calls = 0
+
+    def elapsed(self):
+        """Seconds of the budget used so far."""
+        start = self.start
+        if self.ponder is not None:
+            if not self.ponder.is_hit():
+                return 0.0
+            start = max(start, self.ponder.hit_time)
+        return time.time() - start
+
+    def deadline(self):
+        """time.time() at which the budget runs out (None while pondering)."""
+        if self.ponder is not None and not self.ponder.is_hit():
+            return None
+        return time.time() + self.budget - self.elapsed()
+
+    def is_set(self):
+        if self.cancel is not None and self.cancel.is_set():
+            return True
+        self._calls += 1
+        if not self.expired and self._calls % TIME_CHECK_NODES == 0:
+            self.expired = self.elapsed() > self.budget
+        return self.expired
+
+
+class SearchStats:
+    """
+    Optional search telemetry: pass return_stats=True to get_best_move_iterative to have
+    one filled in and returned. When no stats object is given the search skips all of this.
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.leaf_evals = 0
+        self.quiescence_nodes = 0  # nodes searched past the nominal depth (see quiescence)
+        self.tt_probes = 0
+        self.tt_hits = 0       # probes that found the position
+        self.tt_cutoffs = 0    # ... and could return its stored score straight away
+        self.cutoffs = []      # beta cutoffs, indexed by the position of the move that caused them
+        self.depths = []       # (depth, seconds, nodes, score, (x, y)) per completed depth
+        self.pv = []           # principal variation as (x, y), AI move first
+        self.move = None
+        self.score = None
+        self.time = 0.0
+        self.reason = ""       # how the move was chosen: search, instant, parallel, book
+
+    def add_cutoff(self, index):
+        while len(self.cutoffs) <= index:
+            self.cutoffs.append(0)
+        self.cutoffs[index] += 1
+
+    def depth_reached(self):
+        return self.depths[-1][0] if self.depths else 0
+
+    def first_move_cutoff_rate(self):
+        """Share of cutoffs caused by the first move tried (a measure of move ordering)."""
+        total = sum(self.cutoffs)
+        return self.cutoffs[0] / total if total else 0.0
+
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+
+def allocate_time(max_time, time_left=None, move_number=0):
+    """
+    Seconds to spend on this move: max_time, or less when the game clock
+    (time_left seconds) spread over the moves still expected is shorter.
+    move_number counts the stones already on the board.
+    """
+    budget = max_time
+    if time_left is not None:
+        moves_left = max(MIN_MOVES_LEFT, EXPECTED_MOVES_LEFT - move_number // 2)
+        budget = min(budget, time_left / moves_left)
+    return max(0.0, budget - TIME_SAFETY_MARGIN)
 
-# Cache for evaluation results (global to the module)
-_eval_cache = {}
 
 def clear_eval_cache():
-    """Clear the evaluation cache between AI moves."""
-    global _eval_cache
-    _eval_cache = {}
+    """Clear the transposition table and solved threat positions (e.g. when a new game starts)."""
+    _tt.clear()
+    clear_threat_cache()
+
+def tt_owner(board, ai_stone):
+    """What a transposition table's scores are valid for: the AI's stone and the game variant."""
+    return ai_stone, board.size, board.win_length
+
+
+def reset_node_count():
+    global _node_count
+    _node_count = 0
+
+def get_node_count():
+    """Nodes searched by minimax_optimized since the last reset (each AI move resets it)."""
+    return _node_count
 
 # ----------------------- Core Utility Functions -----------------------
 
-def is_full(state, board_size):
-    """Check if the board is full."""
-    return all(cell != " " for row in state for cell in row)
-
-def check_winner_fast(state, board_size):
-    """Return 'X' or 'O' if either has 5 in a row, else None."""
-    for y in range(board_size):
-        for x in range(board_size):
-            if state[y][x] == " ":
-                continue
-            player = state[y][x]
-            
-            # Only check directions that could form new lines
-            for dx, dy in [(1, 0), (0, 1), (1, 1), (1, -1)]:
-                if count_line_fast(state, x, y, dx, dy, player, board_size) >= WIN_CONSEC:
-                    return player
-    return None
-
-def count_line_fast(state, x, y, dx, dy, player, board_size):
-    """Fast line counting in both directions from (x, y)."""
-    count = 1
-    
-    # Count forward
-    nx, ny = x + dx, y + dy
-    while (0 <= nx < board_size and 0 <= ny < board_size and 
-           state[ny][nx] == player):
-        count += 1
-        nx += dx
-        ny += dy
-    
-    # Count backward 
-    nx, ny = x - dx, y - dy
-    while (0 <= nx < board_size and 0 <= ny < board_size and 
-           state[ny][nx] == player):
-        count += 1
-        nx -= dx
-        ny -= dy
-    
-    return count
+def check_winner_fast(state, board_size, win_length=WIN_CONSEC):
+    """Return 'X' or 'O' if either has win_length in a row, else None."""
+    winner = BitBoard.from_list(state, board_size, win_length).winner()
+    if winner == EMPTY:
+        return None
+    return "X" if winner == STONES["X"] else "O"
 
 # ----------------------- Move Ordering / Priority -----------------------
 
-def evaluate_move_fast(state, x, y, player, opponent, board_size):
+def evaluate_move_fast(board, idx, player, opponent):
     """
     Ultra-fast single move evaluation for move ordering (prioritizing wins/blocks).
+    Reads the threat class each side would get here from the bitboard's cell patterns.
     """
-    # Place piece temporarily
-    state[y][x] = player
-    
-    # Check immediate win
-    max_line = 0
-    for dx, dy in [(1, 0), (0, 1), (1, 1), (1, -1)]:
-        line_count = count_line_fast(state, x, y, dx, dy, player, board_size)
-        max_line = max(max_line, line_count)
-    
-    if max_line >= WIN_CONSEC:
-        state[y][x] = ' '
+    own_shift = 0 if player == X_STONE else 4
+    opp_shift = 4 - own_shift
+
+    offense_score = defense_score = 0
+    own_best = opp_best = 0
+    base = idx * 4
+    for entry in board.cell_patterns[base:base + 4]:
+        own_class = (entry >> own_shift) & 15
+        opp_class = (entry >> opp_shift) & 15
+        offense_score += score_move_patterns(own_class)
+        defense_score += score_move_patterns(opp_class)
+        if own_class > own_best:
+            own_best = own_class
+        if opp_class > opp_best:
+            opp_best = opp_class
+
+    if own_best == FIVE:
         return 10000000 # Win!
-    
-    # Check defense (opponent's potential if *they* played here instead)
-    state[y][x] = opponent # Pretend opponent played here
-    def_max = 0
-    for dx, dy in [(1, 0), (0, 1), (1, 1), (1, -1)]:
-        line_count = count_line_fast(state, x, y, dx, dy, opponent, board_size)
-        def_max = max(def_max, line_count)
-    
-    state[y][x] = ' '
-    
-    # Score based on longest line and block potential
-    offense_score = score_move_patterns(max_line)
-    defense_score = score_move_patterns(def_max)
-    
-    # Crucial: Prioritize blocking opponent's win/4-in-a-row
-    if def_max >= WIN_CONSEC:
+
+    # Crucial: Prioritize blocking opponent's win/open 4
+    if opp_best == FIVE:
          return 9000000 # Block win!
-    if def_max == 4:
-         return offense_score + 900000 # Block 4 (high priority)
-    
+    if opp_best == OPEN_FOUR:
+         return offense_score + 900000 # Block live 3 before it becomes an open 4
+
     # Return offensive score plus weighted defense score for general move ordering
-    return offense_score + defense_score * 1.5 
+    return offense_score + defense_score * DEFENSE_WEIGHT
 
 
-def score_move_patterns(max_count):
-    """Quick pattern scoring based on longest line."""
-    if max_count >= WIN_CONSEC:
-        return 10000000
-    if max_count == 4:
-        return 800000
-    if max_count == 3:
-        return 40000
-    if max_count == 2:
-        return 800
-    return 100
-
-
-def get_priority_moves(state, player, opponent, board_size, max_moves=15):
-    """
-    Get prioritized candidate moves (only the best ones) by scoring moves 
-    near existing pieces.
-    """
-    moves_with_scores = []
-    
-    # First pass: only check cells near existing stones (within 2 spaces)
-    candidates = set()
-    for y in range(board_size):
-        for x in range(board_size):
-            if state[y][x] != ' ':
-                # Add all empty cells within 2 spaces
-                for dy in range(-2, 3):
-                    for dx in range(-2, 3):
-                        nx, ny = x + dx, y + dy
-                        if (0 <= nx < board_size and 0 <= ny < board_size and
-                            state[ny][nx] == ' '):
-                            candidates.add((nx, ny))
-    
+# Move-ordering score of the threat class a move creates (indexed by class)
+_MOVE_CLASS_SCORES = [0, 100, 300, 800, 1500, 40000, 100000, 800000, 10000000]
+
+def score_move_patterns(threat_class):
+    """Quick pattern scoring based on the threat class a move creates."""
+    return _MOVE_CLASS_SCORES[threat_class]
+
+
+def order_moves(board, player, opponent, max_moves=15, ordering=None, ply=0):
+    """
+    Get prioritized candidate moves (as cell indices) on a bitboard by
+    scoring the empty cells within 2 spaces of existing stones.
+    The candidate set and cell patterns are maintained by the bitboard on make/unmake.
+    With a MoveOrdering, what it learned from earlier cutoffs reorders the quiet moves.
+    """
+    candidates = board.candidates
+
     # If board is empty, start in center
     if not candidates:
-        center = board_size // 2
-        return [(center, center)]
-    
-    # Score each candidate
-    for x, y in candidates:
-        score = evaluate_move_fast(state, x, y, player, opponent, board_size)
-        moves_with_scores.append((score, x, y))
-    
+        center = board.size // 2
+        return [board.index(center, center)]
+
+    moves_with_scores = [
+        (evaluate_move_fast(board, idx, player, opponent), idx)
+        for idx in candidates
+    ]
+
     # Sort by score and return top moves
-    moves_with_scores.sort(reverse=True, key=lambda m: m[0])
-    
-    # Return only top moves to search
-    return [(x, y) for _, x, y in moves_with_scores[:max_moves]]
+    moves_with_scores.sort(reverse=True)
+    if ordering is not None:
+        return ordering.order(board, moves_with_scores[:max_moves], player, ply)
+    return [idx for _, idx in moves_with_scores[:max_moves]]
+
+
+# Static scores from here up (wins, blocks, open fours) keep their place ahead of learned ordering
+FORCING_MOVE_SCORE = 800000
+
+class MoveOrdering:
+    """
+    Killer moves per ply, a history table and counter-moves, all learned from beta cutoffs.
+    One instance lives for a whole iterative-deepening search, so each pass reuses
+    what the earlier (shallower) passes learned.
+    """
+
+    def __init__(self, size):
+        cells = size * size
+        self.killers = []  # per ply: [newest, older]
+        # Index 0 unused so the stone value can index directly
+        self.history = [None, [0] * cells, [0] * cells]
+        self.counter = [None, [None] * cells, [None] * cells]  # reply that refuted a move
+
+    def killers_at(self, ply):
+        while len(self.killers) <= ply:
+            self.killers.append([None, None])
+        return self.killers[ply]
+
+    def order(self, board, scored, player, ply):
+        """
+        Order statically scored (score, idx) moves: forcing moves first, then the
+        killers and counter-move if they are among them, then the rest by history score.
+        """
+        moves = [idx for score, idx in scored if score >= FORCING_MOVE_SCORE]
+
+        # Learned moves only reorder the static selection; pulling in extra moves cost more nodes
+        learned = list(self.killers_at(ply))
+        if board.history:
+            learned.append(self.counter[player][board.history[-1]])
+        selected = {idx for _, idx in scored}
+        for idx in learned:
+            if idx in selected and idx not in moves:
+                moves.append(idx)
+
+        history = self.history[player]
+        quiet = [(history[idx], score, idx) for score, idx in scored if score < FORCING_MOVE_SCORE and idx not in moves]
+        quiet.sort(reverse=True)
+        moves.extend(idx for _, _, idx in quiet)
+        return moves
+
+    def cutoff(self, board, idx, player, depth, ply):
+        """Record that playing idx caused a beta cutoff (call with the move already taken back)."""
+        killers = self.killers_at(ply)
+        if killers[0] != idx:
+            killers[1] = killers[0]
+            killers[0] = idx
+        self.history[player][idx] += depth * depth
+        if board.history:
+            self.counter[player][board.history[-1]] = idx
+
+
+def get_priority_moves(state, player, opponent, board_size, max_moves=15, win_length=WIN_CONSEC):
+    """
+    Get prioritized candidate moves (only the best ones) by scoring moves
+    near existing pieces. Takes the game's list board and returns (x, y) moves.
+    """
+    board = BitBoard.from_list(state, board_size, win_length)
+    moves = order_moves(board, STONES[player], STONES[opponent], max_moves)
+    return [board.coords(idx) for idx in moves]
 
 # ----------------------- Main Evaluation Heuristic -----------------------
 
-def evaluate_board(state, ai_player, human_player, board_size):
+def evaluate_board(board, ai_player, human_player):
     """
-    Board evaluation function with caching.
+    Board evaluation function. O(1): reads the bitboard's running line totals.
     """
-    # Create cache key from board state
-    cache_key = tuple(tuple(row) for row in state)
-    if cache_key in _eval_cache:
-        return _eval_cache[cache_key]
-    
     # CRITICAL: Check for immediate wins/losses first
-    winner = check_winner_fast(state, board_size)
-    if winner == ai_player:
-        _eval_cache[cache_key] = 10000000
+    if board.fives[ai_player]:
         return 10000000
-    if winner == human_player:
-        _eval_cache[cache_key] = -10000000
+    if board.fives[human_player]:
         return -10000000
-    
+
     # Main heuristic calculation
-    ai_score = evaluate_player_fast(state, ai_player, human_player, board_size)
-    human_score = evaluate_player_fast(state, human_player, ai_player, board_size)
-    
+    ai_score = evaluate_player_fast(board, ai_player)
+    human_score = evaluate_player_fast(board, human_player)
+
     # Weigh defense (Human score) slightly higher to encourage blocking
-    result = ai_score - human_score * 1.5 
-    _eval_cache[cache_key] = result
-    return result
+    return ai_score - human_score * DEFENSE_WEIGHT
 
 
-def evaluate_player_fast(state, player, opponent, board_size):
+def evaluate_player_fast(board, player):
     """Calculates the combined strength of threats for a single player."""
-    score = 0
-    threat_levels = []
-    
-    # Scan for starting points of lines (only need to scan 1/4 of the board for each direction)
-    for y in range(board_size):
-        for x in range(board_size):
-            if state[y][x] != player:
-                continue
-            
-            # Check each direction (horizontal, vertical, two diagonals)
-            for dx, dy in [(1, 0), (0, 1), (1, 1), (1, -1)]:
-                # Ensure we only count a line once (from its leftmost/topmost end)
-                if (0 <= x - dx < board_size and 0 <= y - dy < board_size and 
-                    state[y - dy][x - dx] == player):
-                    continue
-                
-                line_score, threat_level = evaluate_line_fast(
-                    state, x, y, dx, dy, player, board_size
-                )
-                score += line_score
-                if threat_level >= 4:
-                    threat_levels.append(threat_level)
-    
-    # Bonus for multiple strong threats (double-three, etc.)
-    if len([t for t in threat_levels if t >= 4]) >= 2:
-        score += 500000
-    
-    return score
+    # Sum of pattern scores over every line, kept up to date on make/unmake
+    score = board.scores[player]
 
+    # Bonus for multiple strong threats (double-three, four-three, etc.)
+    if board.threats[player] >= 2:
+        score += MULTI_THREAT_BONUS
 
-def evaluate_line_fast(state, x, y, dx, dy, player, board_size):
-    """Detailed line evaluation for open/closed 2, 3, 4."""
-    count = 0
-    # Find the contiguous block of 'player' stones
-    
-    # Go backwards to find the start of the block
-    start_x, start_y = x, y
-    while (0 <= start_x - dx < board_size and 0 <= start_y - dy < board_size and 
-           state[start_y - dy][start_x - dx] == player):
-        start_x -= dx
-        start_y -= dy
-
-    # Go forward from the start to count the block
-    current_x, current_y = start_x, start_y
-    while (0 <= current_x < board_size and 0 <= current_y < board_size and 
-           state[current_y][current_x] == player):
-        count += 1
-        current_x += dx
-        current_y += dy
-
-    if count >= WIN_CONSEC:
-        return 10000000, WIN_CONSEC
-    
-    # Check the immediate spaces outside the block
-    end_x, end_y = current_x, current_y
-    
-    # Check backward end (before start_x, start_y)
-    open_start = (0 <= start_x - dx < board_size and 0 <= start_y - dy < board_size and 
-                  state[start_y - dy][start_x - dx] == ' ')
-    
-    # Check forward end (at end_x, end_y)
-    open_end = (0 <= end_x < board_size and 0 <= end_y < board_size and 
-                state[end_y][end_x] == ' ')
-
-    open_ends = open_start + open_end
-    
-    # --- Scoring ---
-    if count == 4:
-        if open_ends == 2: return 1000000, 4 # Live Four (win threat)
-        if open_ends == 1: return 50000, 4   # Sleep Four
-        return 0, 4 # Closed Four
-    
-    if count == 3:
-        if open_ends == 2: return 50000, 3  # Live Three (high threat)
-        if open_ends == 1: return 1000, 3   # Sleep Three
-        return 100, 3
-    
-    if count == 2:
-        if open_ends == 2: return 1000, 2 # Live Two
-        return 100, 2
-    
-    if count == 1:
-        return 1, 1
-    
-    return 0, count
+    return score
 
 # ----------------------- Minimax with Iterative Deepening -----------------------
 
-def minimax_optimized(state, depth, alpha, beta, maximizing, ai_player, human_player, board_size):
-    """Optimized minimax with move ordering and pruning."""
-    
-    winner = check_winner_fast(state, board_size)
+def minimax_optimized(board, depth, alpha, beta, maximizing, ai_player, human_player, tt=None, cancel=None, ply=0, pv=None, ordering=None, stats=None):
+    """
+    Optimized minimax (principal variation search) with move ordering, pruning and a
+    transposition table on a bitboard. The first move at each node gets the full window,
+    the rest a null window that is only re-searched if the move turns out better.
+    pv is the previous iteration's principal variation (cell indices from the root);
+    while the search follows it, its move at this ply is tried first. ordering is an
+    optional MoveOrdering (killers, history, counter-moves) updated on every cutoff,
+    and stats an optional SearchStats to count into.
+    Raises SearchCancelled as soon as the cancel token (a threading.Event) is set.
+    """
+    global _node_count
+    _node_count += 1
+    if tt is None:
+        tt = _tt
+    if cancel is not None and cancel.is_set():
+        raise SearchCancelled
+
+    winner = board.winner()  # O(1): kept up to date by make/unmake
     if winner == ai_player:
         return (10000000, None)
     elif winner == human_player:
         return (-10000000, None)
-    elif depth == 0 or is_full(state, board_size):
-        return (evaluate_board(state, ai_player, human_player, board_size), None)
-    
+    elif board.is_full():
+        if stats is not None:
+            stats.leaf_evals += 1
+        return (evaluate_board(board, ai_player, human_player), None)
+    elif depth == 0:
+        # Quiet positions are scored as they are; tactical ones get forcing moves searched first
+        if QUIESCENCE_DEPTH and (board.threats[ai_player] or board.threats[human_player]):
+            return (quiescence(board, QUIESCENCE_DEPTH, alpha, beta, maximizing, ai_player, human_player, stats), None)
+        if stats is not None:
+            stats.leaf_evals += 1
+        return (evaluate_board(board, ai_player, human_player), None)
+
+    # --- Transposition table probe ---
+    key = board.hash ^ ZOBRIST_SIDE if maximizing else board.hash
+    alpha_orig, beta_orig = alpha, beta
+    tt_move = None
+    entry = tt.probe(key)
+    if stats is not None:
+        stats.tt_probes += 1
+    if entry is not None:
+        entry_depth, entry_score, bound, tt_move = entry
+        if stats is not None:
+            stats.tt_hits += 1
+        if entry_depth >= depth:
+            if bound == EXACT:
+                if stats is not None:
+                    stats.tt_cutoffs += 1
+                return entry_score, tt_move
+            if bound == LOWER:
+                alpha = max(alpha, entry_score)
+            else:
+                beta = min(beta, entry_score)
+            if beta <= alpha:
+                if stats is not None:
+                    stats.tt_cutoffs += 1
+                return entry_score, tt_move
+
+    current_player = ai_player if maximizing else human_player
+    opponent = human_player if maximizing else ai_player
+
     # Get prioritized moves (Crucial for speed)
-    moves = get_priority_moves(state, player=ai_player if maximizing else human_player, 
-                                  opponent=human_player if maximizing else ai_player, 
-                                  board_size=board_size, 
-                                  max_moves=12 if depth > 2 else 8)
-    
+    moves = order_moves(board, current_player, opponent, MAX_MOVES if depth > 2 else MAX_MOVES_SHALLOW, ordering, ply)
+
     if not moves:
         return (0, None)
-    
-    current_player = ai_player if maximizing else human_player
-    
+
+    # Best move from an earlier search of this position goes first, the previous
+    # iteration's principal variation move before even that
+    pv_move = pv[ply] if pv is not None and ply < len(pv) else None
+    for first in (tt_move, pv_move):
+        if first is not None and board.cells[first] == EMPTY:
+            if first in moves:
+                moves.remove(first)
+            moves.insert(0, first)
+
     if maximizing:
         best_score = -math.inf
         best_move = None
-        
-        for x, y in moves:
-            # Note: We are mutating the state here and unmaking the move later (faster than copying)
-            state[y][x] = current_player 
-            score, _ = minimax_optimized(state, depth - 1, alpha, beta, False, ai_player, human_player, board_size)
-            state[y][x] = ' ' # Unmake the move
-            
+
+        for i, idx in enumerate(moves):
+            # Note: We are mutating the board here and unmaking the move later (faster than copying)
+            board.make(idx, current_player)
+            child_pv = pv if idx == pv_move else None
+            if i == 0:
+                score, _ = minimax_optimized(board, depth - 1, alpha, beta, False, ai_player, human_player, tt, cancel, ply + 1, child_pv, ordering, stats)
+            else:
+                # Null window: just prove the move is no better than alpha
+                score, _ = minimax_optimized(board, depth - 1, alpha, alpha + 1, False, ai_player, human_player, tt, cancel, ply + 1, child_pv, ordering, stats)
+                if alpha < score < beta:
+                    score, _ = minimax_optimized(board, depth - 1, alpha, beta, False, ai_player, human_player, tt, cancel, ply + 1, child_pv, ordering, stats)
+            board.unmake()
+
             if score > best_score:
                 best_score = score
-                best_move = (x, y)
-            
+                best_move = idx
+
             alpha = max(alpha, best_score)
             if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(board, idx, current_player, depth, ply)
+                if stats is not None:
+                    stats.add_cutoff(i)
                 break
-        
-        return best_score, best_move
     else: # Minimizing
         best_score = math.inf
         best_move = None
-        
-        for x, y in moves:
-            state[y][x] = current_player
-            score, _ = minimax_optimized(state, depth - 1, alpha, beta, True, ai_player, human_player, board_size)
-            state[y][x] = ' ' # Unmake the move
-            
+
+        for i, idx in enumerate(moves):
+            board.make(idx, current_player)
+            child_pv = pv if idx == pv_move else None
+            if i == 0:
+                score, _ = minimax_optimized(board, depth - 1, alpha, beta, True, ai_player, human_player, tt, cancel, ply + 1, child_pv, ordering, stats)
+            else:
+                # Null window: just prove the move is no better than beta
+                score, _ = minimax_optimized(board, depth - 1, beta - 1, beta, True, ai_player, human_player, tt, cancel, ply + 1, child_pv, ordering, stats)
+                if alpha < score < beta:
+                    score, _ = minimax_optimized(board, depth - 1, alpha, beta, True, ai_player, human_player, tt, cancel, ply + 1, child_pv, ordering, stats)
+            board.unmake()
+
             if score < best_score:
                 best_score = score
-                best_move = (x, y)
-            
+                best_move = idx
+
             beta = min(beta, best_score)
             if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(board, idx, current_player, depth, ply)
+                if stats is not None:
+                    stats.add_cutoff(i)
                 break
-        
-        return best_score, best_move
 
+    # --- Transposition table store ---
+    if best_score <= alpha_orig:
+        bound = UPPER
+    elif best_score >= beta_orig:
+        bound = LOWER
+    else:
+        bound = EXACT
+    tt.store(key, depth, best_score, bound, best_move)
+
+    return best_score, best_move
 
-def get_best_move_iterative(state, ai_player, human_player, board_size, max_time=3.0, max_depth=6):
+
+def forcing_moves(board, player, opponent):
+    """
+    Threat moves for player (to move), read from the cell patterns of the candidates.
+    Returns (a winning cell or None, cells the opponent would win on, forcing moves
+    strongest first): making an open four or a four, blocking the opponent's live
+    three (a cell where they would make an open four), making a live three.
+    """
+    own_shift = 0 if player == X_STONE else 4
+    opp_shift = 4 - own_shift
+    patterns = board.cell_patterns
+    opp_fives = []
+    moves = []
+    for idx in board.candidates:
+        base = idx * 4
+        own = opp = 0
+        for entry in patterns[base:base + 4]:
+            cls = (entry >> own_shift) & 15
+            if cls > own:
+                own = cls
+            cls = (entry >> opp_shift) & 15
+            if cls > opp:
+                opp = cls
+        if own == FIVE:
+            return idx, opp_fives, []
+        if opp == FIVE:
+            opp_fives.append(idx)
+        elif own >= FOUR:
+            moves.append((own, idx))
+        elif opp == OPEN_FOUR:
+            moves.append((FOUR - 0.5, idx))  # between making a four and making a three
+        elif own == OPEN_THREE:
+            moves.append((own, idx))
+    moves.sort(reverse=True)
+    return None, opp_fives, [idx for _, idx in moves]
+
+
+def quiescence(board, depth, alpha, beta, maximizing, ai_player, human_player, stats=None):
+    """
+    Search past the nominal depth along forcing moves only, so a leaf with a four or
+    live three on the board is not scored before the threat is played out. The side
+    to move may stand on the static evaluation unless it has a four to answer; at
+    most QUIESCENCE_MOVES forcing moves are tried, for depth more plies.
+    """
+    global _node_count
+    _node_count += 1
+    if stats is not None:
+        stats.quiescence_nodes += 1
+
+    current_player = ai_player if maximizing else human_player
+    opponent = human_player if maximizing else ai_player
+    win = 10000000 if maximizing else -10000000
+
+    five, opp_fives, moves = forcing_moves(board, current_player, opponent)
+    if five is not None:
+        return win  # side to move completes five
+    if len(opp_fives) >= 2:
+        return -win  # open four or double four: one block cannot stop both
+    if opp_fives:
+        moves = opp_fives  # the four must be blocked, no standing pat
+        stand = None
+    else:
+        if stats is not None:
+            stats.leaf_evals += 1
+        stand = evaluate_board(board, ai_player, human_player)
+        if depth == 0 or not moves:
+            return stand
+        if maximizing:
+            if stand >= beta:
+                return stand
+            alpha = max(alpha, stand)
+        else:
+            if stand <= alpha:
+                return stand
+            beta = min(beta, stand)
+        moves = moves[:QUIESCENCE_MOVES]
+
+    best = stand
+    for idx in moves:
+        board.make(idx, current_player)
+        score = quiescence(board, max(depth - 1, 0), alpha, beta, not maximizing, ai_player, human_player, stats)
+        board.unmake()
+        if maximizing:
+            if best is None or score > best:
+                best = score
+            alpha = max(alpha, score)
+        else:
+            if best is None or score < best:
+                best = score
+            beta = min(beta, score)
+        if beta <= alpha:
+            break
+    return best
+
+
+def search_root(board, depth, prev_score, ai_player, human_player, tt, cancel=None, pv=None, ordering=None, stats=None):
+    """
+    One iterative-deepening pass with an aspiration window centred on the previous
+    depth's score, widened (and eventually opened) on the side that fails.
+    Returns (score, best move index).
+    """
+    if prev_score is None or abs(prev_score) >= 9000000:
+        return minimax_optimized(board, depth, -math.inf, math.inf, True, ai_player, human_player, tt, cancel, 0, pv, ordering, stats)
+
+    delta = ASPIRATION_WINDOW
+    alpha, beta = prev_score - delta, prev_score + delta
+    while True:
+        score, move = minimax_optimized(board, depth, alpha, beta, True, ai_player, human_player, tt, cancel, 0, pv, ordering, stats)
+        if score <= alpha:
+            alpha = -math.inf if delta >= ASPIRATION_LIMIT else score - delta
+        elif score >= beta:
+            beta = math.inf if delta >= ASPIRATION_LIMIT else score + delta
+        else:
+            return score, move
+        delta *= 4
+
+
+def principal_variation(board, ai_player, human_player, tt, max_length):
+    """Follow the stored best moves from the root (AI to move); returns a list of cell indices."""
+    pv = []
+    maximizing = True
+    while len(pv) < max_length:
+        key = board.hash ^ ZOBRIST_SIDE if maximizing else board.hash
+        entry = tt.probe(key)
+        if entry is None or entry[3] is None or board.cells[entry[3]] != EMPTY:
+            break
+        pv.append(entry[3])
+        board.make(entry[3], ai_player if maximizing else human_player)
+        maximizing = not maximizing
+    for _ in pv:
+        board.unmake()
+    return pv
+
+
+def find_instant_move(board, ai_stone, human_stone, priority_moves):
+    """
+    Move that needs no search: an immediate win, a block of the opponent's
+    immediate win, or the first move of a forced win found by threat-space search.
+    Returns a cell index or None.
+    """
+    # Only one move to choose from
+    if len(priority_moves) == 1:
+        return priority_moves[0]
+
+    # Check top 5 moves for instant win/block
+    for idx in priority_moves[:5]:
+        # 1. Check for immediate AI win (make() reports a win completed by the move)
+        won = board.make(idx, ai_stone)
+        board.unmake()
+        if won:
+            return idx
+
+        # 2. Check for immediate Human win (must block!)
+        lost = board.make(idx, human_stone)
+        board.unmake()
+        if lost:
+            return idx
+
+    # --- Threat-Space Search (forced wins by fours / threes) ---
+    return find_forced_win(board, ai_stone, human_stone)
+
+
+def predict_reply(state, ai_player, human_player, board_size, tt=None, win_length=WIN_CONSEC):
+    """
+    Expected human reply (x, y) to the position in state (human to move): the
+    best move the last search stored for it, else the top-ordered move.
+    """
+    if tt is None:
+        tt = _tt
+    board = BitBoard.from_list(state, board_size, win_length)
+    human_stone = STONES[human_player]
+
+    move = None
+    if tt.owner == tt_owner(board, STONES[ai_player]):
+        # Human-to-move positions are stored under the plain hash (see minimax_optimized)
+        entry = tt.probe(board.hash)
+        if entry is not None and entry[3] is not None and board.cells[entry[3]] == EMPTY:
+            move = entry[3]
+    if move is None:
+        moves = order_moves(board, human_stone, STONES[ai_player], max_moves=1)
+        if not moves or board.cells[moves[0]] != EMPTY:
+            return None
+        move = moves[0]
+    return board.coords(move)
+
+
+def get_best_move_iterative(state, ai_player, human_player, board_size, max_time=3.0, max_depth=6, tt=None, cancel=None, workers=1, ponder=None, time_left=None, return_stats=False, book=True, win_length=WIN_CONSEC):
     """
     Iterative deepening AI move caller.
+    Accepts the game's list board and 'X'/'O' symbols; the search itself runs on a bitboard
+    of board_size with win_length in a row to win.
+    The transposition table (module-wide unless tt is given) is kept between depths and moves.
+    If the cancel token (a threading.Event) is set, returns the best move found so far.
+    With workers > 1 the root moves are searched in parallel on a process pool (see parallel_search.py).
+    With a ponder token (see ai_worker.Ponder) there is no time limit until the token is hit,
+    after which the budget counts from the hit.
+    The budget is max_time, or less if the game clock (time_left seconds) is short; it is
+    checked inside the search, and an unfinished depth is dropped in favour of the last
+    completed one. No new depth starts once the best move looks settled.
+    With return_stats=True, returns (move, SearchStats) instead of just the move.
+    While the position is in the opening book (book.py) the book move is returned
+    without searching, unless book=False.
     """
-    start_time = time.time()
     best_move = None
-    
+    reset_node_count()
+    stats = SearchStats() if return_stats else None
+
+    def finish(move, reason):
+        if stats is None:
+            return move
+        stats.move = move
+        stats.reason = reason
+        stats.nodes = get_node_count()
+        stats.time = clock.elapsed()
+        return move, stats
+
+    board = BitBoard.from_list(state, board_size, win_length)
+    ai_stone, human_stone = STONES[ai_player], STONES[human_player]
+    clock = SearchClock(allocate_time(max_time, time_left, board.stone_count()), cancel, ponder)
+
+    # --- Opening Book ---
+    if book:
+        book_move = probe_book(board, ai_stone)
+        if book_move is not None:
+            return finish(board.coords(book_move), "book")
+
+    if tt is None:
+        tt = _tt
+    # Stored scores are from the AI's point of view, for one board size and win length
+    owner = tt_owner(board, ai_stone)
+    if tt.owner != owner:
+        tt.clear()
+        tt.owner = owner
+    tt.new_search()
+
     # --- Quick Check for Immediate Win/Block ---
     # Max depth for move ordering must be sufficient to check 5 in a row
-    priority_moves = get_priority_moves(state, ai_player, human_player, board_size, max_moves=20)
-    
-    # Check top 5 moves for instant win/block
-    for x, y in priority_moves[:5]:
-        # 1. Check for immediate AI win
-        state[y][x] = ai_player
-        if check_winner_fast(state, board_size) == ai_player:
-            state[y][x] = ' '
-            return (x, y) 
-        state[y][x] = ' '
-        
-        # 2. Check for immediate Human win (must block!)
-        state[y][x] = human_player
-        if check_winner_fast(state, board_size) == human_player:
-            state[y][x] = ' '
-            return (x, y) 
-        state[y][x] = ' '
+    priority_moves = order_moves(board, ai_stone, human_stone, max_moves=20)
+    instant = find_instant_move(board, ai_stone, human_stone, priority_moves)
+    if instant is not None:
+        return finish(board.coords(instant), "instant")
+
+    # --- Root-Parallel Search (process pool) ---
+    if workers > 1:
+        # Imported here because parallel_search imports this module
+        from parallel_search import search_root_parallel
+        move, depth = search_root_parallel(
+            board, ai_stone, human_stone, clock.deadline, max_depth, workers, cancel
+        )
+        if move is None and priority_moves:
+            move = priority_moves[0]
+        move = board.coords(move) if move is not None else None
+        if stats is not None:
+            stats.depths.append((depth, clock.elapsed(), 0, None, move))
+        return finish(move, "parallel")
 
     # --- Iterative Deepening Search ---
+    score = None
+    pv = None
+    ordering = MoveOrdering(board.size)  # kept across depths
+    stable = 0  # depths in a row that kept the same best move
     for depth in range(1, max_depth + 1):
-        if time.time() - start_time > max_time:
+        # A deeper pass takes several times longer than the last one, so only
+        # start it with most of the budget still left
+        fraction = STABLE_TIME_FRACTION if stable >= STABLE_DEPTHS else SOFT_TIME_FRACTION
+        if clock.elapsed() > clock.budget * fraction:
             break
-        
-        # Must clear the cache before each new depth search
-        clear_eval_cache() 
-        
-        score, move = minimax_optimized(
-            state, depth, -math.inf, math.inf, True, 
-            ai_player, human_player, board_size
-        )
-        
-        if move:
-            best_move = move
-        
-        # Stop early if we found a guaranteed win (score > WINNING_SCORE)
-        if score >= 9000000:
+
+        try:
+            score, move = search_root(board, depth, score, ai_stone, human_stone, tt, clock, pv, ordering, stats)
+        except SearchCancelled:
             break
-    
-    return best_move
\ No newline at end of file
+        pv = principal_variation(board, ai_stone, human_stone, tt, depth)
+
+        if move is not None:
+            new_best = board.coords(move)
+            stable = stable + 1 if new_best == best_move else 0
+            best_move = new_best
+
+        if stats is not None:
+            stats.depths.append((depth, clock.elapsed(), get_node_count(), score, best_move))
+            stats.score = score
+            stats.pv = [board.coords(idx) for idx in pv]
+
+        # Stop early if we found a guaranteed win (score > WINNING_SCORE), or every move loses
+        if score >= 9000000 or score <= -9000000:
+            break
+
+    # Cancelled before the first depth finished: fall back to the best-ordered move
+    if best_move is None and priority_moves:
+        best_move = board.coords(priority_moves[0])
+
+    return finish(best_move, "search")
+
+
+def get_best_move_for(game, player=None, **kwargs):
+    """
+    get_best_move_iterative for a game_state.GameState: searches for player (default: the
+    side to move) on the game's board and win length, budgeted by that player's clock
+    unless time_left is given. Other keyword arguments are passed through.
+    """
+    player = player or game.current_player
+    opponent = "O" if player == "X" else "X"
+    kwargs.setdefault("time_left", game.time_left[player])
+    return get_best_move_iterative(game.board, player, opponent, game.size, win_length=game.win_length, **kwargs)
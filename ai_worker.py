@@ -0,0 +1,77 @@
+"""
+Runs AI move searches off the pygame main thread.
+
+AISearch starts the search on a daemon thread and acts as a future: the game
+loop checks done() and collects result() once it is ready; an on_done
+callback, called from the worker thread, lets the loop sleep until then. The
+search receives a cancellation token (a threading.Event) through its
+``cancel`` keyword, which minimax_optimized checks at every node; a
+cancelled search returns the best move found so far.
+
+While the human thinks, a search can ponder: it searches the position after
+the human's expected reply with no time limit. If the human plays that move
+(a ponder hit) the same search carries on with its normal time budget;
+otherwise it is cancelled and the real search starts with a warm
+transposition table.
+"""
+
+import threading
+import time
+
+
+class AISearch:
+    """Future-style handle for a move search running on a worker thread."""
+
+    def __init__(self, search, *args, on_done=None, **kwargs):
+        self.cancel_token = threading.Event()
+        kwargs["cancel"] = self.cancel_token
+        self._on_done = on_done  # called from the worker thread once the search has finished
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(search, args, kwargs), daemon=True)
+        self._thread.start()
+
+    def _run(self, search, args, kwargs):
+        try:
+            self._result = search(*args, **kwargs)
+        except BaseException as error:  # re-raised in the caller's thread by result()
+            self._error = error
+        finally:
+            self._done.set()
+            if self._on_done is not None:
+                self._on_done()
+
+    def done(self):
+        """True once the search has finished (or stopped after a cancel)."""
+        return self._done.is_set()
+
+    def cancel(self):
+        """Ask the search to stop; it still finishes with its best move so far."""
+        self.cancel_token.set()
+
+    def cancelled(self):
+        return self.cancel_token.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the search (up to timeout seconds) and return its move."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("AI search still running")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Ponder:
+    """Shared with a search started on the opponent's time; hit() starts its clock."""
+
+    def __init__(self, expected_move):
+        self.expected_move = expected_move
+        self.hit_time = None
+
+    def hit(self):
+        """The opponent played the expected move: the search now runs on its normal budget."""
+        self.hit_time = time.time()
+
+    def is_hit(self):
+        return self.hit_time is not None
@@ -0,0 +1,324 @@
+"""
+Headless engine benchmark.
+
+Runs the AI over a fixed corpus of positions (openings, midgames and
+forced-win puzzles) and times the primitives the search is built from.
+For every position it reports the time and nodes to reach a fixed depth,
+nodes per second and transposition-table hit rate, and, for puzzles,
+whether the engine played one of the expected moves under the Hard time
+limit. Results are written as JSON so runs on different commits can be
+compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+--scaling measures search speed and memory on larger boards instead
+(15x15, 19x19 and 25x25 by default).
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from ai import (
+    get_best_move_iterative, get_priority_moves, check_winner_fast, evaluate_board,
+    get_node_count, TT_MEMORY_MB,
+)
+from bitboard import BitBoard, STONES, WIN_CONSEC, get_geometry, _build_geometry
+from threats import clear_cache as clear_threat_cache
+from transposition import TranspositionTable
+from vector_eval import HAS_NUMPY, score_children
+
+BOARD_SIZE = 15
+DEFAULT_DEPTH = 5       # depth for the time-to-depth measurement
+DEFAULT_MAX_TIME = 4.0  # Hard difficulty's time limit, used for the solve check
+DEFAULT_MAX_DEPTH = 6   # Hard difficulty's depth limit
+PRIMITIVE_SECONDS = 0.5  # minimum time spent timing each primitive
+SCALING_SIZES = (15, 19, 25)  # board sizes compared by --scaling
+SCALING_DEPTH = 4        # depth searched on every size by --scaling
+
+# Each position: stones as (x, y, symbol), the side to move and, for puzzles,
+# every move that counts as solving it.
+POSITIONS = [
+    # --- Openings ---
+    {"name": "opening-3", "category": "opening", "to_move": "O",
+     "stones": [(7, 7, "X"), (8, 8, "O"), (7, 8, "X")]},
+    {"name": "opening-diagonal", "category": "opening", "to_move": "X",
+     "stones": [(7, 7, "X"), (8, 8, "O"), (6, 8, "X"), (8, 6, "O")]},
+    {"name": "opening-5", "category": "opening", "to_move": "O",
+     "stones": [(7, 7, "X"), (8, 7, "O"), (6, 6, "X"), (8, 8, "O"), (8, 6, "X")]},
+
+    # --- Midgames ---
+    {"name": "midgame-7", "category": "midgame", "to_move": "O",
+     "stones": [(7, 7, "X"), (8, 8, "O"), (7, 8, "X"), (6, 6, "O"), (8, 7, "X"), (9, 9, "O"), (6, 8, "X")]},
+    {"name": "midgame-8", "category": "midgame", "to_move": "X",
+     "stones": [(7, 7, "X"), (7, 8, "O"), (8, 6, "X"), (6, 8, "O"), (9, 5, "X"), (10, 4, "O"), (8, 8, "X"), (6, 6, "O")]},
+    {"name": "midgame-9", "category": "midgame", "to_move": "O",
+     "stones": [(7, 7, "X"), (8, 8, "O"), (6, 8, "X"), (7, 9, "O"), (9, 7, "X"), (8, 6, "O"), (6, 9, "X"),
+                (6, 7, "O"), (5, 8, "X")]},
+
+    # --- Puzzles ---
+    {"name": "win-in-one", "category": "puzzle", "to_move": "X", "expected": [(9, 7), (4, 7)],
+     "stones": [(5, 7, "X"), (6, 7, "X"), (7, 7, "X"), (8, 7, "X"), (5, 8, "O"), (6, 8, "O"), (7, 8, "O"), (9, 9, "O")]},
+    {"name": "block-four", "category": "puzzle", "to_move": "O", "expected": [(7, 4)],
+     "stones": [(7, 5, "X"), (7, 6, "X"), (7, 7, "X"), (7, 8, "X"), (7, 9, "O"), (8, 8, "O"), (6, 6, "O"), (9, 9, "X")]},
+    {"name": "vcf-4", "category": "puzzle", "to_move": "X", "expected": [(7, 5), (9, 8), (7, 9), (10, 9)],
+     "stones": [(7, 7, "X"), (8, 8, "O"), (9, 7, "X"), (10, 7, "O"), (8, 7, "X"), (5, 7, "O"), (7, 8, "X"),
+                (9, 6, "O"), (8, 5, "X"), (7, 10, "O"), (7, 6, "X"), (7, 4, "O"), (8, 9, "X"), (6, 7, "O"),
+                (6, 5, "X"), (5, 4, "O")]},
+    {"name": "vcf-3", "category": "puzzle", "to_move": "X", "expected": [(10, 8)],
+     "stones": [(7, 7, "X"), (8, 8, "O"), (9, 7, "X"), (10, 7, "O"), (9, 8, "X"), (9, 9, "O"), (10, 9, "X"),
+                (11, 10, "O"), (8, 7, "X"), (6, 5, "O"), (10, 10, "X"), (5, 7, "O"), (10, 11, "X"),
+                (10, 13, "O"), (7, 5, "X"), (7, 8, "O")]},
+    {"name": "vcf-4-crowded", "category": "puzzle", "to_move": "X", "expected": [(12, 8), (12, 9)],
+     "stones": [(7, 7, "X"), (7, 9, "O"), (9, 9, "X"), (9, 7, "O"), (6, 10, "X"), (8, 10, "O"), (9, 11, "X"),
+                (9, 10, "O"), (11, 10, "X"), (11, 11, "O"), (6, 8, "X"), (8, 8, "O"), (8, 9, "X"), (6, 7, "O"),
+                (9, 5, "X"), (8, 6, "O"), (11, 5, "X"), (10, 5, "O"), (10, 8, "X"), (6, 11, "O"), (8, 5, "X"),
+                (10, 9, "O"), (11, 8, "X"), (10, 7, "O"), (12, 7, "X"), (11, 7, "O"), (13, 8, "X"), (9, 8, "O"),
+                (10, 11, "X"), (9, 12, "O")]},
+]
+
+
+def build_state(position, size=BOARD_SIZE):
+    """The game's list-of-lists board for a corpus position."""
+    state = [[" " for _ in range(size)] for _ in range(size)]
+    for x, y, symbol in position["stones"]:
+        state[y][x] = symbol
+    return state
+
+
+def _timed_search(state, to_move, max_time, max_depth, win_length=WIN_CONSEC):
+    """
+    Search from a cold start; returns (move, seconds, nodes, tt hit rate, ai.SearchStats).
+    stats.reason tells whether the move was searched ("search") or found without a
+    search (e.g. "instant" for a win, a block or a threat-space win).
+    """
+    opponent = "O" if to_move == "X" else "X"
+    tt = TranspositionTable(TT_MEMORY_MB)
+    clear_threat_cache()
+    start = time.perf_counter()
+    move, stats = get_best_move_iterative(state, to_move, opponent, len(state), max_time=max_time, max_depth=max_depth,
+                                          tt=tt, return_stats=True, book=False, win_length=win_length)
+    elapsed = time.perf_counter() - start
+    return move, elapsed, get_node_count(), tt.hit_rate(), stats
+
+
+def bench_position(position, depth=DEFAULT_DEPTH, max_time=DEFAULT_MAX_TIME, max_depth=DEFAULT_MAX_DEPTH):
+    """
+    Time-to-depth and solve results for one corpus position. When the engine answers
+    without searching (see _timed_search), time_to_depth, nodes_per_second and
+    tt_hit_rate are None and the position is left out of those summary figures.
+    """
+    state = build_state(position)
+    to_move = position["to_move"]
+
+    # Time to depth: no time limit, stop at the fixed depth
+    _, depth_time, nodes, hit_rate, stats = _timed_search(state, to_move, float("inf"), depth)
+    searched = stats.reason == "search"
+    # Solve check: the Hard difficulty settings
+    move, move_time, _, _, _ = _timed_search(state, to_move, max_time, max_depth)
+
+    expected = position.get("expected")
+    return {
+        "name": position["name"],
+        "category": position["category"],
+        "depth": depth,
+        "depth_reached": stats.depth_reached(),
+        "reason": stats.reason,
+        "time_to_depth": round(depth_time, 4) if searched else None,
+        "nodes": nodes,
+        "nodes_per_second": (round(nodes / depth_time) if depth_time > 0 else 0) if searched else None,
+        "tt_hit_rate": round(hit_rate, 4) if searched else None,
+        "move": list(move) if move else None,
+        "move_time": round(move_time, 4),
+        "expected": [list(m) for m in expected] if expected else None,
+        "solved": (tuple(move) in {tuple(m) for m in expected}) if expected else None,
+    }
+
+
+def bench_primitives(positions=POSITIONS, seconds=PRIMITIVE_SECONDS):
+    """Calls per second of the search's building blocks, averaged over the corpus."""
+    states = [(build_state(p), p["to_move"]) for p in positions]
+    boards = [BitBoard.from_list(state) for state, _ in states]
+
+    def rate(call):
+        start = time.perf_counter()
+        calls = 0
+        elapsed = 0.0
+        while elapsed < seconds:
+            for i, (state, to_move) in enumerate(states):
+                call(i, state, to_move)
+            calls += len(states)
+            elapsed = time.perf_counter() - start
+        return round(calls / elapsed)
+
+    def opponent(symbol):
+        return "O" if symbol == "X" else "X"
+
+    results = {
+        "evaluate_board_per_second": rate(
+            lambda i, state, to_move: evaluate_board(boards[i], STONES[to_move], STONES[opponent(to_move)])),
+        "get_priority_moves_per_second": rate(
+            lambda i, state, to_move: get_priority_moves(state, to_move, opponent(to_move), len(state))),
+        "check_winner_fast_per_second": rate(
+            lambda i, state, to_move: check_winner_fast(state, len(state))),
+    }
+    if HAS_NUMPY:
+        # One call scores every candidate child of the position (vector_eval.py)
+        results["score_children_per_second"] = rate(
+            lambda i, state, to_move: score_children(
+                boards[i], sorted(boards[i].candidates), STONES[to_move], STONES[to_move], STONES[opponent(to_move)]))
+    return results
+
+
+def bench_scaling(sizes=SCALING_SIZES, depth=SCALING_DEPTH, win_length=WIN_CONSEC, positions=POSITIONS):
+    """
+    Nodes per second and memory by board size: the opening and midgame positions
+    are moved to the centre of each board and searched to a fixed depth. Memory is
+    the board geometry (tables shared by every board of that size) plus one BitBoard;
+    the transposition table has a fixed size whatever the board.
+    """
+    results = []
+    for size in sizes:
+        get_geometry(size, win_length)  # so the BitBoard below only allocates its own state
+        tracemalloc.start()
+        geometry = _build_geometry(size, win_length)
+        geometry_bytes = tracemalloc.get_traced_memory()[0]
+        board = BitBoard(size, win_length)
+        board_bytes = tracemalloc.get_traced_memory()[0] - geometry_bytes
+        tracemalloc.stop()
+        del geometry, board
+
+        shift = size // 2 - BOARD_SIZE // 2
+        nodes = 0
+        seconds = 0.0
+        for position in positions:
+            if position["category"] == "puzzle":
+                continue
+            moved = {"stones": [(x + shift, y + shift, symbol) for x, y, symbol in position["stones"]]}
+            state = build_state(moved, size)
+            _, elapsed, count, _, stats = _timed_search(state, position["to_move"], float("inf"), depth, win_length)
+            if stats.reason != "search":
+                continue  # answered without a search: no speed to measure
+            nodes += count
+            seconds += elapsed
+        results.append({
+            "size": size,
+            "win_length": win_length,
+            "depth": depth,
+            "nodes": nodes,
+            "seconds": round(seconds, 4),
+            "nodes_per_second": round(nodes / seconds) if seconds > 0 else 0,
+            "geometry_kb": round(geometry_bytes / 1024),
+            "board_kb": round(board_bytes / 1024, 1),
+        })
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(depth=DEFAULT_DEPTH, max_time=DEFAULT_MAX_TIME, max_depth=DEFAULT_MAX_DEPTH,
+                  positions=POSITIONS, verbose=True):
+    """Benchmark the whole corpus; returns the JSON-ready results dict."""
+    results = []
+    for position in positions:
+        result = bench_position(position, depth, max_time, max_depth)
+        results.append(result)
+        if verbose:
+            solved = "" if result["solved"] is None else ("  solved" if result["solved"] else "  MISSED")
+            if result["time_to_depth"] is None:
+                print(f"{result['name']:<16} no search ({result['reason']})  move {result['move']}{solved}")
+            else:
+                print(f"{result['name']:<16} depth {result['depth_reached']} in {result['time_to_depth']:.3f}s  "
+                      f"{result['nodes']:>7} nodes  {result['nodes_per_second']:>6} n/s  "
+                      f"TT {result['tt_hit_rate']:.1%}  move {result['move']}{solved}")
+
+    primitives = bench_primitives(positions)
+    if verbose:
+        for name, value in primitives.items():
+            print(f"{name:<32} {value}")
+
+    # Speed figures only count the positions that were actually searched
+    searched = [r for r in results if r["time_to_depth"] is not None]
+    total_nodes = sum(r["nodes"] for r in searched)
+    total_time = sum(r["time_to_depth"] for r in searched)
+    puzzles = [r for r in results if r["solved"] is not None]
+    summary = {
+        "positions_searched": len(searched),
+        "total_nodes": total_nodes,
+        "total_time_to_depth": round(total_time, 4),
+        "nodes_per_second": round(total_nodes / total_time) if total_time > 0 else 0,
+        "mean_tt_hit_rate": round(sum(r["tt_hit_rate"] for r in searched) / len(searched), 4) if searched else 0,
+        "puzzles_solved": sum(1 for r in puzzles if r["solved"]),
+        "puzzles": len(puzzles),
+    }
+    if verbose:
+        print(f"summary: {summary}")
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {"depth": depth, "max_time": max_time, "max_depth": max_depth},
+        "positions": results,
+        "primitives": primitives,
+        "summary": summary,
+    }
+
+
+def compare(old, new):
+    """Print old -> new for every summary and primitive figure."""
+    print(f"compare {old.get('commit')} -> {new.get('commit')}")
+    for section in ("summary", "primitives"):
+        for key, new_value in new[section].items():
+            old_value = old.get(section, {}).get(key)
+            change = ""
+            if isinstance(old_value, (int, float)) and old_value:
+                change = f" ({(new_value - old_value) / old_value:+.1%})"
+            print(f"  {key:<32} {old_value} -> {new_value}{change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Five in a Row engine benchmark")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the JSON results ('-' for stdout)")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="depth for the time-to-depth measurement")
+    parser.add_argument("--max-time", type=float, default=DEFAULT_MAX_TIME, help="time limit for the solve check")
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH, help="depth limit for the solve check")
+    parser.add_argument("--compare", metavar="JSON", help="an earlier results file to compare against")
+    parser.add_argument("--scaling", action="store_true", help="compare speed and memory across board sizes instead")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SCALING_SIZES), help="board sizes for --scaling")
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        for row in bench_scaling(args.sizes):
+            print(f"{row['size']:>2}x{row['size']:<2} depth {row['depth']}  {row['nodes']:>7} nodes in {row['seconds']:.3f}s  "
+                  f"{row['nodes_per_second']:>6} n/s  geometry {row['geometry_kb']} KB  board {row['board_kb']} KB")
+        return
+
+    results = run_benchmark(args.depth, args.max_time, args.max_depth, verbose=args.output != "-")
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Compact bitboard position used by the AI search.
+
+Every row, column and diagonal of the board is stored as one integer bitmask
+per player, so line scans become a handful of shifts instead of walks over a
+list of lists. Moves are applied with make()/unmake() and undone in LIFO
+order, which lets the search mutate a single position in place. A 64-bit
+Zobrist hash of the position, a 2-bit-per-cell code of every line (see
+patterns.py), the pattern value of every line and the pattern of every cell
+near the change are updated incrementally on every make/unmake, only along
+the four lines through the changed cell. So are the hashes of the position
+under the board's 8 symmetries (see symmetry.py). The set of candidate moves (empty
+cells within two of a stone) is kept with per-cell reference counts.
+
+Wins are found from the last move only: make() measures the run of the mover's
+stones through the new cell on each of its four line bitmasks and counts the
+moves that completed win_length in a row, so winner() never scans the board.
+"""
+
+import random
+
+from patterns import WIN_CONSEC, EMPTY_LINE_VALUE, get_patterns, empty_line_code
+from symmetry import permutations
+
+EMPTY = 0
+X_STONE = 1
+O_STONE = 2
+
+STONES = {"X": X_STONE, "O": O_STONE}
+SYMBOLS = {EMPTY: " ", X_STONE: "X", O_STONE: "O"}
+
+# Same order the rest of the engine uses: horizontal, vertical, diagonal, anti-diagonal
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+
+# Fixed seed so Zobrist hashes are stable between runs (and usable on disk)
+ZOBRIST_SEED = 0x5A0B
+# XOR-ed into a hash by callers that need the side to move as part of the key
+ZOBRIST_SIDE = random.Random(ZOBRIST_SEED).getrandbits(64)
+
+# Candidate moves are the empty cells within this many cells of a stone
+CANDIDATE_RADIUS = 2
+
+# Geometry is shared by every board of the same size and win length
+_geometry_cache = {}
+
+
+def _build_geometry(size, win_length=WIN_CONSEC):
+    """
+    Number every line on the board and record, for each cell, which line it
+    lies on in each direction, its position along that line, the bit it uses
+    in the line's bitmask and (two bits per cell) in the line's code, and the
+    cells along the line whose pattern window covers it.
+    """
+    patterns = get_patterns(win_length)
+    half_window = patterns["half_window"]
+    cell_lines = [[] for _ in range(size * size)]
+    line_lengths = []
+
+    def add_line(cells, direction):
+        line_id = len(line_lengths)
+        line_lengths.append(len(cells))
+        for pos, (x, y) in enumerate(cells):
+            # (pattern slot, code shift) of every cell whose window includes this one
+            window = tuple(
+                ((cy * size + cx) * 4 + direction, 2 * p)
+                for p, (cx, cy) in enumerate(cells)
+                if abs(p - pos) <= half_window
+            )
+            cell_lines[y * size + x].append(
+                (line_id, pos, 1 << pos, 1 << (2 * (pos + half_window)), window)
+            )
+
+    # Rows (dx=1, dy=0)
+    for y in range(size):
+        add_line([(x, y) for x in range(size)], 0)
+    # Columns (dx=0, dy=1)
+    for x in range(size):
+        add_line([(x, y) for y in range(size)], 1)
+    # Diagonals (dx=1, dy=1), keyed by x - y
+    for k in range(-(size - 1), size):
+        x0, y0 = max(k, 0), max(-k, 0)
+        add_line([(x0 + i, y0 + i) for i in range(size - abs(k))], 2)
+    # Anti-diagonals (dx=1, dy=-1), keyed by x + y
+    for a in range(2 * size - 1):
+        x0 = max(0, a - size + 1)
+        y0 = a - x0
+        add_line([(x0 + i, y0 - i) for i in range(min(a, 2 * size - 2 - a) + 1)], 3)
+
+    # Cells within CANDIDATE_RADIUS of each cell (for candidate reference counts)
+    neighbours = []
+    for y in range(size):
+        for x in range(size):
+            neighbours.append(tuple(
+                ny * size + nx
+                for ny in range(max(0, y - CANDIDATE_RADIUS), min(size, y + CANDIDATE_RADIUS + 1))
+                for nx in range(max(0, x - CANDIDATE_RADIUS), min(size, x + CANDIDATE_RADIUS + 1))
+                if (nx, ny) != (x, y)
+            ))
+
+    # Pattern of every (cell, direction) on the empty board
+    table, window_mask = patterns["table"], patterns["window_mask"]
+    empty_codes = [empty_line_code(length, win_length) for length in line_lengths]
+    empty_patterns = [0] * (size * size * 4)
+    for idx, lines in enumerate(cell_lines):
+        for direction, (line_id, pos, _, _, _) in enumerate(lines):
+            empty_patterns[idx * 4 + direction] = table[(empty_codes[line_id] >> (2 * pos)) & window_mask]
+
+    # One random 64-bit key per (stone, cell); index 0 unused like BitBoard.lines
+    rng = random.Random(ZOBRIST_SEED * 1000 + size)
+    zobrist = [None] + [[rng.getrandbits(64) for _ in range(size * size)] for _ in (X_STONE, O_STONE)]
+    # Keys of each (stone, cell) under the 8 symmetries: the key of the cell it maps to
+    forward, _ = permutations(size)
+    sym_zobrist = [None] + [
+        [tuple(keys[perm[idx]] for perm in forward) for idx in range(size * size)]
+        for keys in zobrist[1:]
+    ]
+
+    return {
+        "patterns": patterns,
+        "cell_lines": [tuple(lines) for lines in cell_lines],
+        "zobrist": zobrist,
+        "sym_zobrist": sym_zobrist,
+        "line_lengths": line_lengths,
+        "empty_codes": empty_codes,
+        "empty_patterns": empty_patterns,
+        "neighbours": neighbours,
+    }
+
+
+def _run_length(line, pos, bit):
+    """Length of the run of set bits in line through position pos (whose bit is set)."""
+    above = line >> pos
+    run = (~above & (above + 1)).bit_length() - 1  # pos and the set bits above it
+    return run + pos - (~line & (bit - 1)).bit_length()  # and those below it
+
+
+def get_geometry(size, win_length=WIN_CONSEC):
+    """Return the (cached) line geometry for a board of the given size and win length."""
+    geometry = _geometry_cache.get((size, win_length))
+    if geometry is None:
+        geometry = _geometry_cache[size, win_length] = _build_geometry(size, win_length)
+    return geometry
+
+
+class BitBoard:
+    """Board position stored as per-player line bitmasks with make/unmake."""
+
+    def __init__(self, size=15, win_length=WIN_CONSEC):
+        geometry = get_geometry(size, win_length)
+        self.size = size
+        self.win_length = win_length
+        self._table = geometry["patterns"]["table"]
+        self._window_mask = geometry["patterns"]["window_mask"]
+        self._line_value = geometry["patterns"]["line_value"]
+        self.cell_lines = geometry["cell_lines"]
+        self.line_lengths = geometry["line_lengths"]
+        self._zobrist = geometry["zobrist"]
+        self._sym_zobrist = geometry["sym_zobrist"]
+        self._neighbours = geometry["neighbours"]
+
+        self.cells = [EMPTY] * (size * size)
+        # Index 0 is unused so the stone value can index directly
+        self.lines = [None, [0] * len(self.line_lengths), [0] * len(self.line_lengths)]
+        self.bits = [0, 0, 0]
+        self.history = []
+        self.hash = 0
+        # Zobrist hash under each symmetry transform (sym_hashes[0] == hash)
+        self.sym_hashes = [0] * 8
+
+        # Line codes and running pattern totals per player (see patterns.line_value)
+        self.codes = geometry["empty_codes"][:]
+        self.line_values = [EMPTY_LINE_VALUE] * len(self.line_lengths)
+        self.scores = [0, 0, 0]
+        self.threats = [0, 0, 0]
+        self.fives = [0, 0, 0]
+        # Moves in history that completed win_length (or more) in a row, per stone
+        self.wins = [0, 0, 0]
+
+        # PATTERN_TABLE entry of every cell in each direction, at index cell * 4 + direction
+        self.cell_patterns = geometry["empty_patterns"][:]
+
+        # Empty cells near a stone, with how many stones are within CANDIDATE_RADIUS of each cell
+        self.candidates = set()
+        self.near = [0] * (size * size)
+
+    @classmethod
+    def from_list(cls, state, board_size=None, win_length=WIN_CONSEC):
+        """Build a bitboard from the game's list-of-lists board."""
+        size = board_size or len(state)
+        board = cls(size, win_length)
+        for y in range(size):
+            row = state[y]
+            for x in range(size):
+                if row[x] != " ":
+                    board.make(y * size + x, STONES[row[x]])
+        return board
+
+    def to_list(self):
+        """Return the position as the game's list-of-lists board."""
+        size = self.size
+        return [[SYMBOLS[self.cells[y * size + x]] for x in range(size)] for y in range(size)]
+
+    def copy(self):
+        """Independent copy of this position (history included)."""
+        board = BitBoard.__new__(BitBoard)
+        board.__dict__.update(self.__dict__)
+        board.cells = self.cells[:]
+        board.lines = [None, self.lines[1][:], self.lines[2][:]]
+        board.bits = self.bits[:]
+        board.history = self.history[:]
+        board.sym_hashes = self.sym_hashes[:]
+        board.codes = self.codes[:]
+        board.line_values = self.line_values[:]
+        board.scores = self.scores[:]
+        board.threats = self.threats[:]
+        board.fives = self.fives[:]
+        board.wins = self.wins[:]
+        board.cell_patterns = self.cell_patterns[:]
+        board.candidates = set(self.candidates)
+        board.near = self.near[:]
+        return board
+
+    # ----------------------- Coordinates -----------------------
+
+    def index(self, x, y):
+        return y * self.size + x
+
+    def coords(self, idx):
+        return idx % self.size, idx // self.size
+
+    def canonical(self):
+        """
+        (canonical hash, transform): the smallest hash of this position over the 8
+        symmetries and the transform giving it (see symmetry.to_canonical).
+        """
+        hashes = self.sym_hashes
+        h = min(hashes)
+        return h, hashes.index(h)
+
+    # ----------------------- Make / Unmake -----------------------
+
+    def make(self, idx, stone):
+        """Place stone on the empty cell idx. Returns True if it completes win_length in a row."""
+        self.cells[idx] = stone
+        self.bits[stone] |= 1 << idx
+        self.hash ^= self._zobrist[stone][idx]
+        self.sym_hashes = [h ^ k for h, k in zip(self.sym_hashes, self._sym_zobrist[stone][idx])]
+        lines = self.lines[stone]
+        codes = self.codes
+        won = False
+        win_length = self.win_length
+        for line_id, pos, bit, code_bit, _ in self.cell_lines[idx]:
+            line = lines[line_id] = lines[line_id] | bit
+            codes[line_id] += stone * code_bit
+            if not won and line.bit_count() >= win_length:
+                # _run_length(line, pos, bit), inlined: make is on the search's hot path
+                above = line >> pos
+                won = (~above & (above + 1)).bit_length() - 1 + pos - (~line & (bit - 1)).bit_length() >= win_length
+        if won:
+            self.wins[stone] += 1
+        self._revalue(idx)
+        self.history.append(idx)
+
+        candidates = self.candidates
+        candidates.discard(idx)
+        near, cells = self.near, self.cells
+        for cell in self._neighbours[idx]:
+            near[cell] += 1
+            if near[cell] == 1 and cells[cell] == EMPTY:
+                candidates.add(cell)
+        return won
+
+    def unmake(self):
+        """Take back the most recent move."""
+        idx = self.history.pop()
+        stone = self.cells[idx]
+        self.cells[idx] = EMPTY
+        self.bits[stone] ^= 1 << idx
+        self.hash ^= self._zobrist[stone][idx]
+        self.sym_hashes = [h ^ k for h, k in zip(self.sym_hashes, self._sym_zobrist[stone][idx])]
+        lines = self.lines[stone]
+        codes = self.codes
+        # Only a stone with a win on record can be taking one back
+        won = False
+        check = self.wins[stone] > 0
+        for line_id, pos, bit, code_bit, _ in self.cell_lines[idx]:
+            line = lines[line_id]
+            if check and not won:
+                won = _run_length(line, pos, bit) >= self.win_length
+            lines[line_id] = line ^ bit
+            codes[line_id] -= stone * code_bit
+        if won:
+            self.wins[stone] -= 1
+        self._revalue(idx)
+
+        candidates = self.candidates
+        near = self.near
+        for cell in self._neighbours[idx]:
+            near[cell] -= 1
+            if near[cell] == 0:
+                candidates.discard(cell)
+        if near[idx]:
+            candidates.add(idx)
+
+    def _revalue(self, idx):
+        """
+        Re-value the four lines through idx, fold the change into the running
+        totals, and refresh the pattern of every cell whose window covers idx.
+        """
+        codes = self.codes
+        values = self.line_values
+        patterns = self.cell_patterns
+        table, window_mask, line_value = self._table, self._window_mask, self._line_value
+        scores, threats, fives = self.scores, self.threats, self.fives
+        for line_id, _, _, _, window in self.cell_lines[idx]:
+            code = codes[line_id]
+            for slot, shift in window:
+                patterns[slot] = table[(code >> shift) & window_mask]
+
+            old = values[line_id]
+            new = values[line_id] = line_value(code)
+            scores[X_STONE] += new[0] - old[0]
+            threats[X_STONE] += new[1] - old[1]
+            fives[X_STONE] += new[2] - old[2]
+            scores[O_STONE] += new[3] - old[3]
+            threats[O_STONE] += new[4] - old[4]
+            fives[O_STONE] += new[5] - old[5]
+
+    # ----------------------- Queries -----------------------
+
+    def stone_count(self):
+        return len(self.history)
+
+    def is_full(self):
+        return len(self.history) == self.size * self.size
+
+    def winner(self):
+        """Return the stone with win_length (or more) in a row, else EMPTY. O(1)."""
+        if self.wins[X_STONE]:
+            return X_STONE
+        if self.wins[O_STONE]:
+            return O_STONE
+        return EMPTY
@@ -0,0 +1,268 @@
+"""
+Opening book: stored answers for the first moves of a game.
+
+The book is a sorted array of fixed-size records on disk, memory-mapped
+when first used and searched by bisection, so a lookup costs a few
+microseconds and the file is never read into memory as a whole. Records
+are keyed by a canonical position hash: the smallest Zobrist hash of the
+position over the board's 8 rotations and reflections, so positions that
+are the same up to symmetry share one entry (see symmetry.py), with
+ZOBRIST_SIDE XOR-ed in when O is to move, so each side only gets its own
+answers. The move is stored in the canonical orientation and mapped back
+on lookup.
+
+The book can be built from engine analysis (every position the engine's
+top few candidate moves lead to, up to a number of plies) or from a
+self-play record file (selfplay.py):
+
+    python book.py analyse --plies 5
+    python book.py games selfplay.jsonl
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+from bitboard import BitBoard, STONES, WIN_CONSEC, O_STONE, ZOBRIST_SIDE
+from symmetry import to_canonical, from_canonical
+
+BOOK_FILE = "opening_book.bin"
+BOOK_MAGIC = b"GMKBOOK3"
+HEADER = struct.Struct("<8sHHHI")  # magic, board size, win length, max stones, record count
+RECORD = struct.Struct("<QHH")     # canonical hash, canonical move, weight
+
+BOOK_MAX_STONES = 6      # positions with more stones are never looked up
+ANALYSIS_PLIES = 5       # default depth of the analysed opening tree
+ANALYSIS_WIDTH = 6       # candidate moves followed at every position of the tree
+ANALYSIS_MAX_TIME = 2.0  # engine time per analysed position
+ANALYSIS_MAX_DEPTH = 6
+MIN_GAMES = 2            # a self-play move needs this many games to enter the book
+
+# Book opened by probe(), loaded on first use
+_book = None
+_book_loaded = False
+
+
+def book_key(board, stone):
+    """(key, transform) of board's position with stone to move (see the module docstring)."""
+    key, transform = board.canonical()
+    if stone == O_STONE:
+        key ^= ZOBRIST_SIDE
+    return key, transform
+
+
+def default_path():
+    """The book shipped next to this module (or in the PyInstaller bundle)."""
+    base = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, BOOK_FILE)
+
+
+class OpeningBook:
+    """Read-only, memory-mapped book file."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.win_length, self.max_stones, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != BOOK_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, i):
+        return struct.unpack_from("<Q", self._map, HEADER.size + i * RECORD.size)[0]
+
+    def entries(self, key):
+        """Every (canonical move, weight) stored for a canonical hash."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        while lo < self.count:
+            record_key, move, weight = RECORD.unpack_from(self._map, HEADER.size + lo * RECORD.size)
+            if record_key != key:
+                break
+            found.append((move, weight))
+            lo += 1
+        return found
+
+    def lookup(self, board, stone):
+        """Best book move (cell index on this board) for stone to move, or None."""
+        if board.size != self.size or board.win_length != self.win_length or len(board.history) > self.max_stones:
+            return None
+        key, transform = book_key(board, stone)
+        found = self.entries(key)
+        if not found:
+            return None
+        move = max(found, key=lambda entry: entry[1])[0]
+        move = from_canonical(move, transform, board.size)
+        if board.cells[move] != 0:
+            return None  # hash collision
+        return move
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def write_book(path, entries, size=15, win_length=WIN_CONSEC, max_stones=BOOK_MAX_STONES):
+    """Write {canonical hash: {canonical move: weight}} as a book file."""
+    records = sorted(
+        (key, move, min(weight, 0xFFFF))
+        for key, moves in entries.items()
+        for move, weight in moves.items()
+    )
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(BOOK_MAGIC, size, win_length, max_stones, len(records)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+    return len(records)
+
+
+def _add(entries, board, stone, move, weight):
+    """Record move (a cell index on board) for stone to move in board's position, in the canonical orientation."""
+    key, transform = book_key(board, stone)
+    moves = entries.setdefault(key, {})
+    canonical_move = to_canonical(move, transform, board.size)
+    moves[canonical_move] = moves.get(canonical_move, 0) + weight
+
+
+def probe(board, stone):
+    """Book move for stone to move in a BitBoard position from the default book, or None (no book, or out of book)."""
+    global _book, _book_loaded
+    if not _book_loaded:
+        _book_loaded = True
+        try:
+            _book = OpeningBook(default_path())
+        except (OSError, ValueError):
+            _book = None
+    if _book is None:
+        return None
+    return _book.lookup(board, stone)
+
+
+# ----------------------- Building -----------------------
+
+def build_from_analysis(plies=ANALYSIS_PLIES, width=ANALYSIS_WIDTH, size=15, win_length=WIN_CONSEC,
+                        max_time=ANALYSIS_MAX_TIME, max_depth=ANALYSIS_MAX_DEPTH, verbose=True):
+    """
+    Engine analysis of the opening tree: from the empty board, store the engine's
+    move for every position reached by the top `width` candidate moves of either
+    side, up to `plies` stones (ranked by vector_eval when NumPy is available).
+    Returns the book entries.
+    """
+    # Imported here so looking up the book does not pull in the search
+    from ai import get_best_move_iterative, order_moves
+    from vector_eval import HAS_NUMPY, order_moves_batch
+    if HAS_NUMPY:
+        # Every candidate reply scored as one batch
+        order_moves = order_moves_batch
+    from transposition import TranspositionTable
+
+    entries = {}
+    tt = TranspositionTable()
+    board = BitBoard(size, win_length)
+    seen = set()
+
+    def visit():
+        key, _ = board.canonical()
+        if key in seen:
+            return
+        seen.add(key)
+        symbol = "X" if len(board.history) % 2 == 0 else "O"
+        opponent = "O" if symbol == "X" else "X"
+        if board.history:
+            move = get_best_move_iterative(board.to_list(), symbol, opponent, size, max_time=max_time,
+                                           max_depth=max_depth, tt=tt, book=False, win_length=win_length)
+            move = board.index(*move)
+        else:
+            move = board.index(size // 2, size // 2)
+        _add(entries, board, STONES[symbol], move, 1)
+        if verbose:
+            print(f"{len(seen):>4} positions  {[board.coords(i) for i in board.history]} -> {board.coords(move)}")
+
+        if len(board.history) + 1 >= plies:
+            return
+        children = [move] + [idx for idx in order_moves(board, STONES[symbol], STONES[opponent], width) if idx != move]
+        for idx in children[:width]:
+            board.make(idx, STONES[symbol])
+            visit()
+            board.unmake()
+
+    visit()
+    return entries
+
+
+def build_from_games(records, max_stones=BOOK_MAX_STONES, min_games=MIN_GAMES, size=15, win_length=WIN_CONSEC):
+    """
+    Book entries from self-play game records: for every early position, the move
+    with the best score for the side that played it (win 1, draw 1/2), weighted
+    by that score, among moves played at least min_games times. Games of other
+    board sizes or win lengths are skipped.
+    """
+    stats = {}  # canonical hash -> {canonical move: [games, points]}
+    for record in records:
+        if record.get("size", 15) != size or record.get("win_length", WIN_CONSEC) != win_length:
+            continue
+        winner = None
+        if record["result"] != "draw":
+            a_won = record["result"] == "A"
+            winner = record["a"] if a_won else ("O" if record["a"] == "X" else "X")
+        board = BitBoard(size, win_length)
+        for ply, (x, y) in enumerate(record["moves"][:max_stones + 1]):
+            symbol = "X" if ply % 2 == 0 else "O"
+            idx = board.index(x, y)
+            if ply >= record.get("opening", 0):
+                key, transform = book_key(board, STONES[symbol])
+                move_stats = stats.setdefault(key, {}).setdefault(to_canonical(idx, transform, size), [0, 0.0])
+                move_stats[0] += 1
+                move_stats[1] += 1.0 if winner == symbol else (0.5 if winner is None else 0.0)
+            board.make(idx, STONES[symbol])
+
+    entries = {}
+    for key, moves in stats.items():
+        played = {move: s for move, s in moves.items() if s[0] >= min_games}
+        if played:
+            move, (games, points) = max(played.items(), key=lambda item: item[1][1] / item[1][0])
+            entries[key] = {move: max(1, round(1000 * points / games))}
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Five in a Row opening book")
+    parser.add_argument("--output", default=default_path(), help="book file to write")
+    parser.add_argument("--size", type=int, default=15, help="board size")
+    parser.add_argument("--win-length", type=int, default=WIN_CONSEC, help="stones in a row to win")
+    sub = parser.add_subparsers(dest="source", required=True)
+    analyse = sub.add_parser("analyse", help="engine analysis of the opening tree")
+    analyse.add_argument("--plies", type=int, default=ANALYSIS_PLIES)
+    analyse.add_argument("--width", type=int, default=ANALYSIS_WIDTH)
+    analyse.add_argument("--max-time", type=float, default=ANALYSIS_MAX_TIME)
+    analyse.add_argument("--max-depth", type=int, default=ANALYSIS_MAX_DEPTH)
+    games = sub.add_parser("games", help="self-play records (selfplay.py output)")
+    games.add_argument("records", help="JSON-lines game records")
+    games.add_argument("--min-games", type=int, default=MIN_GAMES)
+    args = parser.parse_args(argv)
+
+    if args.source == "analyse":
+        entries = build_from_analysis(args.plies, args.width, args.size, args.win_length,
+                                      max_time=args.max_time, max_depth=args.max_depth)
+    else:
+        from selfplay import load_records
+        entries = build_from_games(load_records(args.records), min_games=args.min_games,
+                                   size=args.size, win_length=args.win_length)
+    max_stones = args.plies - 1 if args.source == "analyse" else BOOK_MAX_STONES
+    count = write_book(args.output, entries, args.size, args.win_length, max_stones)
+    print(f"{count} positions written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
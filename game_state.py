@@ -0,0 +1,118 @@
+"""
+Headless game state and rules, shared by the game modes, the AI and the network.
+
+GameState holds one round: the board (a list of rows of "X", "O" or " ", the
+format the AI and the network layer exchange), whose turn it is, the moves
+played, the result and both players' clocks. It does not use pygame, so a
+server, the self-play runner or a benchmark can run many games in one process.
+
+A move can only win along the four lines through the new stone, so play()
+checks just those: at most 8 * (win_length - 1) cells whatever the board size.
+"""
+
+from patterns import WIN_CONSEC
+
+EMPTY = " "
+SYMBOLS = ("X", "O")
+TIME_LIMIT = 300  # Seconds on each player's clock
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1))
+
+
+def other(symbol):
+    """The opponent of "X" or "O"."""
+    return "O" if symbol == "X" else "X"
+
+
+def wins_at(board, x, y, win_length=WIN_CONSEC):
+    """True if the stone at (x, y) is part of win_length (or more) in a row."""
+    symbol = board[y][x]
+    size = len(board)
+    for dx, dy in DIRECTIONS:
+        count = 1
+        for sign in (1, -1):
+            nx, ny = x + dx * sign, y + dy * sign
+            while 0 <= nx < size and 0 <= ny < size and board[ny][nx] == symbol:
+                count += 1
+                nx += dx * sign
+                ny += dy * sign
+        if count >= win_length:
+            return True
+    return False
+
+
+class GameState:
+    """One round of the game: board, side to move, history, result and clocks."""
+
+    def __init__(self, size=15, win_length=WIN_CONSEC, time_limit=TIME_LIMIT, first="X"):
+        self.size = size
+        self.win_length = win_length
+        self.time_limit = time_limit
+        self.reset(first)
+
+    def reset(self, first="X"):
+        """Start a new round on an empty board with full clocks; first moves first."""
+        self.board = [[EMPTY] * self.size for _ in range(self.size)]
+        self.first = first
+        self.current_player = first
+        self.history = []   # Moves played, as (x, y, symbol)
+        self.winner = None  # "X" or "O" once the round is won (on the board or on time)
+        self.game_over = False
+        self.time_left = {symbol: float(self.time_limit) for symbol in SYMBOLS}
+
+    def copy(self):
+        game = GameState(self.size, self.win_length, self.time_limit, self.first)
+        game.board = [row[:] for row in self.board]
+        game.current_player = self.current_player
+        game.history = list(self.history)
+        game.winner = self.winner
+        game.game_over = self.game_over
+        game.time_left = dict(self.time_left)
+        return game
+
+    def is_legal(self, x, y):
+        """True if the side to move may play at (x, y)."""
+        return (not self.game_over and 0 <= x < self.size and 0 <= y < self.size
+                and self.board[y][x] == EMPTY)
+
+    def play(self, x, y, symbol=None):
+        """
+        Place symbol (default: the side to move) at (x, y) and pass the turn.
+        Returns True if the move wins. Raises ValueError for an illegal move.
+        """
+        symbol = symbol or self.current_player
+        if not self.is_legal(x, y):
+            raise ValueError(f"illegal move {(x, y)} for {symbol}")
+        self.board[y][x] = symbol
+        self.history.append((x, y, symbol))
+        if wins_at(self.board, x, y, self.win_length):
+            self.winner = symbol
+            self.game_over = True
+            return True
+        if len(self.history) == self.size * self.size:
+            self.game_over = True  # Board full: a draw
+        self.current_player = other(symbol)
+        return False
+
+    def undo(self):
+        """Take back the last move (and any result it gave); returns it as (x, y, symbol)."""
+        x, y, symbol = self.history.pop()
+        self.board[y][x] = EMPTY
+        self.current_player = symbol
+        self.winner = None
+        self.game_over = False
+        return x, y, symbol
+
+    def tick(self, seconds, symbol=None):
+        """
+        Run the clock of symbol (default: the side to move) for seconds.
+        Returns True if it has just run out, which loses the round.
+        """
+        if self.game_over:
+            return False
+        symbol = symbol or self.current_player
+        self.time_left[symbol] = max(0.0, self.time_left[symbol] - seconds)
+        if self.time_left[symbol] > 0:
+            return False
+        self.winner = other(symbol)
+        self.game_over = True
+        return True
@@ -25,8 +25,14 @@ info_font = pygame.font.SysFont("Arial", 22)
 settings = {
     "sfx": True,
     "music": True,
+    "board_size": 15,
+    "win_length": 5,
 }
 
+# Choices cycled through by the settings buttons
+BOARD_SIZES = [15, 19, 25]
+WIN_LENGTHS = [5, 4, 6]
+
 # --- Menu State ---
 menu_state = "main"  # "main", "settings", "howto", "mode_select", "difficulty_select", "symbol_select"
 game_in_progress = False
@@ -45,6 +51,11 @@ def draw_text_center(text, font, color, surface, y):
     return rect
 
 
+def next_choice(choices, current):
+    """The choice after current, wrapping around."""
+    return choices[(choices.index(current) + 1) % len(choices)]
+
+
 def draw_button(text, y, enabled=True):
     mouse = pygame.mouse.get_pos()
     button_rect = pygame.Rect(WIDTH // 2 - 150, y, 300, 60)
@@ -292,13 +303,20 @@ def settings_menu():
     sfx_text = f"SFX: {'ON' if settings['sfx'] else 'OFF'}"
     music_text = f"Music: {'ON' if settings['music'] else 'OFF'}"
 
-    sfx_btn = draw_button(sfx_text, 240)
-    music_btn = draw_button(music_text, 320)
-    back_btn = draw_button("Back", 460)
+    board_text = f"Board: {settings['board_size']}x{settings['board_size']}"
+    win_text = f"Win: {settings['win_length']} in a row"
+
+    sfx_btn = draw_button(sfx_text, 180)
+    music_btn = draw_button(music_text, 255)
+    board_btn = draw_button(board_text, 330)
+    win_btn = draw_button(win_text, 405)
+    back_btn = draw_button("Back", 500)
 
     return {
         "sfx": sfx_btn,
         "music": music_btn,
+        "board_size": board_btn,
+        "win_length": win_btn,
         "back": back_btn
     }
 
@@ -308,9 +326,9 @@ def how_to_play_menu():
     draw_text_center("How to Play", title_font, TITLE_COLOR, screen, 80)
 
     lines = [
-        "1. The game is played on a 15x15 grid.",
+        f"1. The game is played on a {settings['board_size']}x{settings['board_size']} grid (see Settings).",
         "2. Players take turns placing X or O.",
-        "3. The first to get 5 in a row (horizontally, vertically, or diagonally)",
+        f"3. The first to get {settings['win_length']} in a row (horizontally, vertically, or diagonally)",
         "   wins the game.",
         "4. Use the mouse to click and place your symbol.",
         "5. You can restart or exit from the top buttons.",
@@ -375,6 +393,10 @@ def run_menu(in_progress=False):
                         settings["sfx"] = not settings["sfx"]
                     elif buttons["music"].collidepoint(event.pos):
                         settings["music"] = not settings["music"]
+                    elif buttons["board_size"].collidepoint(event.pos):
+                        settings["board_size"] = next_choice(BOARD_SIZES, settings["board_size"])
+                    elif buttons["win_length"].collidepoint(event.pos):
+                        settings["win_length"] = next_choice(WIN_LENGTHS, settings["win_length"])
                     elif buttons["back"].collidepoint(event.pos):
                         menu_state = "main"
 
@@ -4,6 +4,8 @@ import threading
 import json
 import time
 
+from patterns import MIN_WIN_LENGTH, MAX_WIN_LENGTH, MAX_LINE
+
 class NetworkGame:
     _connection_lock = threading.Lock()
 
@@ -21,6 +23,8 @@ class NetworkGame:
         self.disconnect_callback = None  # ✅ NEW: Disconnect callback
         self.is_connected = False
         self.opponent_name = None
+        self.game_config = None  # {"size": ..., "win_length": ...} once received
+        self.game = None  # game_state.GameState received moves are checked against
         self.listener_ready = False
         
         self._validate_network_params()
@@ -260,6 +264,35 @@ class NetworkGame:
                 return False
         return False
 
+    def send_config(self, size, win_length):
+        """Send the game's board size and win length (host to client)."""
+        if not self.is_connected:
+            print("[NETWORK] Cannot send config - not connected")
+            return False
+            
+        if self.conn:
+            try:
+                msg = json.dumps({"type": "config", "size": size, "win_length": win_length}).encode()
+                self.conn.sendall(msg + b"\n")
+                print(f"[NETWORK] Sent config: {size}x{size}, {win_length} in a row")
+                return True
+            except Exception as e:
+                print(f"[NETWORK ERROR] Failed to send config: {e}")
+                self.is_connected = False
+                return False
+        return False
+
+    @staticmethod
+    def _parse_config(data):
+        """The host's {"size", "win_length"} if this side can play it, else None."""
+        try:
+            size, win_length = int(data["size"]), int(data["win_length"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not MIN_WIN_LENGTH <= win_length <= MAX_WIN_LENGTH or not win_length <= size <= MAX_LINE:
+            return None
+        return {"size": size, "win_length": win_length}
+
     def send_continue(self):
         """Send continue signal to opponent."""
         if not self.is_connected:
@@ -317,9 +350,20 @@ class NetworkGame:
                             if self.name_callback:
                                 self.name_callback(self.opponent_name)
                         
+                        elif msg_type == "config":
+                            config = self._parse_config(data)
+                            if config is None:
+                                print(f"[NETWORK] Ignored invalid game config: {msg}")
+                            else:
+                                self.game_config = config
+                                print(f"[NETWORK] ✓ Received game config: {self.game_config}")
+                        
                         elif msg_type == "move":
-                            if self.callback:
-                                self.callback({"x": data["x"], "y": data["y"]})
+                            x, y = int(data["x"]), int(data["y"])
+                            if self.game is not None and not self.game.is_legal(x, y):
+                                print(f"[NETWORK] Dropped illegal move: ({x}, {y})")
+                            elif self.callback:
+                                self.callback({"x": x, "y": y})
                         
                         elif msg_type == "continue":
                             print("[NETWORK] ✓ Opponent pressed continue")
@@ -0,0 +1,222 @@
+"""
+Root-parallel search on a process pool.
+
+Each iterative-deepening pass hands the ordered root moves to a
+ProcessPoolExecutor; every worker searches one root move at a time with
+minimax_optimized on its own bitboard and its own transposition table, which
+survives between tasks and moves. Workers share the best root score found so
+far (the alpha bound) through shared memory, so a root move searched after a
+good one starts with a narrower window. A shared stop flag doubles as the
+workers' cancel token, so a pass that runs past its deadline is abandoned
+and the last completed depth's move is used.
+
+Run this module directly for a benchmark of depth reached in a fixed time
+against the number of worker processes.
+"""
+
+import math
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from bitboard import BitBoard, STONES
+from ai import minimax_optimized, order_moves, tt_owner, SearchCancelled, MAX_MOVES, MAX_MOVES_SHALLOW
+from transposition import TranspositionTable
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+WORKER_TT_MEMORY_MB = 32  # Transposition table size in each worker process
+POLL_INTERVAL = 0.02      # Seconds between deadline/cancel checks while workers run
+
+# Parent side: the pool and its shared values (created with the pool)
+_pool = None
+_pool_workers = 0
+_shared_alpha = None
+_shared_stop = None
+
+# Worker side: set up by _init_worker in each pool process
+_worker_alpha = None
+_worker_stop = None
+_worker_tt = None
+
+
+class _SharedFlag:
+    """Cancel token over a shared integer, polled by minimax_optimized in a worker."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def is_set(self):
+        return self._value.value != 0
+
+
+def _init_worker(alpha, stop):
+    global _worker_alpha, _worker_stop, _worker_tt
+    _worker_alpha = alpha
+    _worker_stop = _SharedFlag(stop)
+    _worker_tt = TranspositionTable(WORKER_TT_MEMORY_MB)
+
+
+def _search_root_move(stones, size, win_length, move, depth, ai_stone, human_stone):
+    """
+    Worker task: score one root move to the given depth.
+    Returns (move, score or None if stopped, whether the score is exact rather than
+    an upper bound from failing low against the shared alpha).
+    """
+    board = BitBoard(size, win_length)
+    for idx, stone in stones:
+        board.make(idx, stone)
+
+    tt = _worker_tt
+    owner = tt_owner(board, ai_stone)
+    if tt.owner != owner:
+        tt.clear()
+        tt.owner = owner
+
+    board.make(move, ai_stone)
+    # Start from the best root score any worker has found in this pass
+    alpha = _worker_alpha.value
+    try:
+        score, _ = minimax_optimized(
+            board, depth - 1, alpha, math.inf, False,
+            ai_stone, human_stone, tt, _worker_stop
+        )
+    except SearchCancelled:
+        return move, None, False
+
+    with _worker_alpha.get_lock():
+        if score > _worker_alpha.value:
+            _worker_alpha.value = score
+    return move, score, score > alpha
+
+
+def get_pool(workers=DEFAULT_WORKERS):
+    """Return the shared process pool, (re)creating it for a new worker count."""
+    global _pool, _pool_workers, _shared_alpha, _shared_stop
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _shared_alpha = multiprocessing.Value("d", -math.inf)
+        _shared_stop = multiprocessing.Value("i", 0, lock=False)
+        _pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(_shared_alpha, _shared_stop)
+        )
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the worker processes (a new pool is started on the next search)."""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+    _pool = None
+    _pool_workers = 0
+
+
+def search_root_parallel(board, ai_stone, human_stone, deadline, max_depth, workers=DEFAULT_WORKERS, cancel=None):
+    """
+    Iterative deepening with the root moves spread over the worker pool.
+    deadline is called at every check and returns the time.time() at which to stop, or
+    None for no limit yet (e.g. ai.SearchClock.deadline, which is None while pondering
+    and moves with the ponder hit); cancel is an optional threading.Event.
+    Returns (best cell index or None, last completed depth).
+    """
+    pool = get_pool(workers)
+    stones = [(idx, board.cells[idx]) for idx in board.history]
+    best_move = None
+    completed = 0
+
+    for depth in range(1, max_depth + 1):
+        if _past(deadline):
+            break
+
+        moves = order_moves(board, ai_stone, human_stone, max_moves=MAX_MOVES if depth > 2 else MAX_MOVES_SHALLOW)
+        # Previous pass's best move goes first so it sets the shared bound early
+        if best_move in moves:
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+
+        _shared_alpha.value = -math.inf
+        _shared_stop.value = 0
+        futures = [
+            pool.submit(_search_root_move, stones, board.size, board.win_length, move, depth, ai_stone, human_stone)
+            for move in moves
+        ]
+
+        pending = set(futures)
+        stopped = False
+        while pending:
+            _, pending = wait(pending, timeout=POLL_INTERVAL)
+            if pending and (_past(deadline) or (cancel is not None and cancel.is_set())):
+                # Workers notice the flag at their next node; queued tasks return at once
+                _shared_stop.value = 1
+                wait(pending)
+                stopped = True
+                break
+        if stopped:
+            break
+
+        # Highest exact score wins; ties go to the earlier (better-ordered) move
+        best_score = -math.inf
+        for future in futures:
+            move, score, exact = future.result()
+            if exact and score > best_score:
+                best_score, best_move = score, move
+        completed = depth
+
+        # Stop early if we found a guaranteed win
+        if best_score >= 9000000:
+            break
+
+    return best_move, completed
+
+
+def _past(deadline):
+    """True once the time returned by the deadline callable has passed."""
+    stop_at = deadline()
+    return stop_at is not None and time.time() > stop_at
+
+
+# ----------------------- Benchmark -----------------------
+
+BENCHMARK_POSITIONS = [
+    [(7, 7, "X"), (8, 8, "O"), (7, 8, "X"), (6, 6, "O"), (8, 7, "X"), (9, 9, "O"), (6, 8, "X")],
+    [(7, 7, "X"), (7, 8, "O"), (8, 6, "X"), (6, 8, "O"), (9, 5, "X"), (10, 4, "O"), (8, 8, "X"), (6, 6, "O")],
+    [(7, 7, "X"), (8, 7, "O"), (6, 6, "X"), (8, 8, "O"), (8, 6, "X"), (7, 6, "O")],
+]
+
+
+def benchmark_scaling(worker_counts=None, time_limit=5.0, max_depth=20, size=15):
+    """
+    Depth reached within time_limit seconds for each worker count, per benchmark position.
+    Returns {workers: [depth per position]}.
+    """
+    if worker_counts is None:
+        worker_counts = sorted({1, 2, 4, 8, 16, DEFAULT_WORKERS})
+    results = {}
+    for workers in worker_counts:
+        depths = []
+        for position in BENCHMARK_POSITIONS:
+            board = BitBoard(size)
+            for x, y, symbol in position:
+                board.make(board.index(x, y), STONES[symbol])
+            ai_stone = STONES["O" if len(position) % 2 else "X"]
+            human_stone = 3 - ai_stone
+            # Fresh pool per count, so every worker starts with an empty table
+            shutdown_pool()
+            get_pool(workers)
+            stop_at = time.time() + time_limit
+            _, depth = search_root_parallel(
+                board, ai_stone, human_stone, lambda: stop_at, max_depth, workers
+            )
+            depths.append(depth)
+        results[workers] = depths
+        print(f"{workers:>3} workers: depth reached {depths}")
+    shutdown_pool()
+    return results
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or None
+    benchmark_scaling(counts)
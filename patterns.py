@@ -0,0 +1,254 @@
+"""
+Line pattern evaluation shared by the bitboard and the search.
+
+Every line (row, column or diagonal) is kept as a single integer with two
+bits per cell (0 empty, 1 X, 2 O, 3 wall), padded with walls on both ends.
+The threat class of a stone, or of a stone that would be played on an empty
+cell, only depends on the 9-cell window centred on it, so all of those are
+precomputed once at import into PATTERN_TABLE: one lookup gives the class
+for both players, including broken shapes like X_XXX, XX_XX and X_XX.
+
+A whole line's value only depends on its code, so line values are cached
+per line content and the bitboard keeps a running total by re-valuing just
+the four lines through each changed cell.
+
+Everything here is written for WIN_CONSEC in a row. Other win lengths get
+their own tables from get_patterns(win_length): the window is then
+2 * win_length - 1 cells, and the classes keep their meaning relative to
+the win length (FOUR is one move from winning, and so on).
+"""
+
+WIN_CONSEC = 5  # 5 in a row to win (the default win length)
+MIN_WIN_LENGTH = 4
+MAX_WIN_LENGTH = 6  # the 6-in-a-row table has 4M entries and takes about a second to build
+
+FIVE_SCORE = 10000000
+
+# Longest line the bitmask helpers are prepared for (boards up to 32x32)
+MAX_LINE = 32
+
+# --- Threat classes (ordered by strength) ---
+DEAD = 0        # can never become five
+ONE = 1
+TWO = 2         # Sleep Two
+OPEN_TWO = 3    # Live Two
+THREE = 4       # Sleep Three
+OPEN_THREE = 5  # Live Three (one move from an open four)
+FOUR = 6        # Sleep Four (one way to five)
+OPEN_FOUR = 7   # Live Four (two ways to five, can't be blocked)
+FIVE = 8
+
+CLASS_SCORES = [0, 1, 100, 1000, 1000, 50000, 50000, 1000000, FIVE_SCORE]
+
+# Two-bit cell codes
+CELL_EMPTY = 0
+CELL_WALL = 3
+
+HALF_WINDOW = WIN_CONSEC - 1           # cells either side of the centre
+WINDOW = 2 * HALF_WINDOW + 1           # 9 cells for five in a row
+WINDOW_MASK = (1 << (2 * WINDOW)) - 1
+# Walls padding each end of a line code so every window stays inside it
+PADDING = (1 << (2 * HALF_WINDOW)) - 1
+
+# What a shape is, given the best shape one more stone turns it into
+_DEMOTE = {
+    OPEN_FOUR: OPEN_THREE, FOUR: THREE,
+    OPEN_THREE: OPEN_TWO, THREE: TWO,
+    OPEN_TWO: ONE, TWO: ONE, ONE: ONE, DEAD: DEAD,
+}
+
+
+def _classify_windows(win_length=WIN_CONSEC):
+    """
+    Threat class of the centre stone for every own-view window: cells are
+    0 empty, 1 own, 2 blocked (opponent or off-board), centre always own.
+    Indexed by the base-3 value of the 8 surrounding cells, leftmost digit lowest.
+    """
+    half_window = win_length - 1
+    window = 2 * half_window + 1
+    classes = {}
+
+    def classify(cells):
+        known = classes.get(cells)
+        if known is not None:
+            return known
+
+        # Segments of WIN_CONSEC cells that contain the centre
+        segments = [cells[s:s + win_length] for s in range(half_window + 1)]
+        if any(all(c == 1 for c in seg) for seg in segments):
+            result = FIVE
+        else:
+            # Empty cells that would complete a five through the centre
+            completions = set()
+            for s, seg in enumerate(segments):
+                if 2 not in seg and seg.count(1) == win_length - 1:
+                    completions.add(s + seg.index(0))
+            if len(completions) >= 2:
+                result = OPEN_FOUR
+            elif completions:
+                result = FOUR
+            else:
+                # Otherwise a shape is its best follow-up, one step down
+                best = DEAD
+                for i, c in enumerate(cells):
+                    if c == 0:
+                        filled = classify(cells[:i] + (1,) + cells[i + 1:])
+                        if filled > best:
+                            best = filled
+                result = _DEMOTE[best]
+
+        classes[cells] = result
+        return result
+
+    table = []
+    for index in range(3 ** (window - 1)):
+        digits = []
+        for _ in range(window - 1):
+            index, digit = divmod(index, 3)
+            digits.append(digit)
+        table.append(classify(tuple(digits[:half_window]) + (1,) + tuple(digits[half_window:])))
+    return table
+
+
+def _build_pattern_table(win_length=WIN_CONSEC):
+    """
+    Table indexed by a 2-bit-per-cell window code. Each entry packs the
+    class for X in the low 4 bits and for O in the next 4: for a stone in
+    the centre only its owner's class is set, for an empty centre both are
+    set to the class that player would get by playing there.
+    """
+    half_window = win_length - 1
+    own_view = _classify_windows(win_length)
+    half_cells = 1 << (2 * half_window)
+    power = 3 ** half_window
+
+    def half_values(stone):
+        """Own-view base-3 value of every half-window code, for one player."""
+        values = []
+        for code in range(half_cells):
+            value = 0
+            for i in range(half_window):
+                cell = (code >> (2 * i)) & 3
+                digit = 0 if cell == CELL_EMPTY else (1 if cell == stone else 2)
+                value += digit * 3 ** i
+            values.append(value)
+        return values
+
+    values_x, values_o = half_values(1), half_values(2)
+
+    table = [0] * (1 << (2 * (2 * half_window + 1)))
+    centre_shift = 2 * half_window
+    right_shift = centre_shift + 2
+    for right in range(half_cells):
+        right_x, right_o = power * values_x[right], power * values_o[right]
+        for left in range(half_cells):
+            x_class = own_view[values_x[left] + right_x]
+            o_class = own_view[values_o[left] + right_o]
+            code = left | (right << right_shift)
+            table[code] = x_class | (o_class << 4)
+            table[code | (1 << centre_shift)] = x_class
+            table[code | (2 << centre_shift)] = o_class << 4
+    return table
+
+
+PATTERN_TABLE = _build_pattern_table()
+
+
+def empty_line_code(length, win_length=WIN_CONSEC):
+    """Code of an empty line of the given length, walls included."""
+    half_window = win_length - 1
+    padding = (1 << (2 * half_window)) - 1
+    return padding | (padding << (2 * (length + half_window)))
+
+
+# Value of a line with no stones on it (see line_value)
+EMPTY_LINE_VALUE = (0, 0, 0, 0, 0, 0)
+
+# Pattern tables and line-value caches per win length (see get_patterns)
+_pattern_sets = {}
+
+
+def get_patterns(win_length=WIN_CONSEC):
+    """
+    The (cached) pattern table for a win length, with its window geometry and a
+    line-value function that caches per line code, as a dict.
+    """
+    patterns = _pattern_sets.get(win_length)
+    if patterns is None:
+        if not MIN_WIN_LENGTH <= win_length <= MAX_WIN_LENGTH:
+            raise ValueError(f"win length must be {MIN_WIN_LENGTH}..{MAX_WIN_LENGTH}, got {win_length}")
+        table = PATTERN_TABLE if win_length == WIN_CONSEC else _build_pattern_table(win_length)
+        half_window = win_length - 1
+        values = {}
+
+        def cached_line_value(code):
+            value = values.get(code)
+            if value is None:
+                value = values[code] = evaluate_line_fast(code, win_length)
+            return value
+
+        patterns = _pattern_sets[win_length] = {
+            "win_length": win_length,
+            "half_window": half_window,
+            "window_mask": (1 << (2 * (2 * half_window + 1))) - 1,
+            "table": table,
+            "line_value": cached_line_value,
+        }
+    return patterns
+
+
+def evaluate_line_fast(code, win_length=WIN_CONSEC):
+    """
+    Detailed line evaluation for open/closed 2, 3, 4 (gapped shapes included).
+    Each group of stones (stones at most one empty cell apart) counts once,
+    with the strongest class any of its stones has.
+    Returns (x_score, x_threats, x_fives, o_score, o_threats, o_fives), where
+    threats counts fours and live threes.
+    """
+    patterns = get_patterns(win_length)
+    table, half_window, window_mask = patterns["table"], patterns["half_window"], patterns["window_mask"]
+    length = code.bit_length() // 2 - 2 * half_window
+    result = [0, 0, 0, 0, 0, 0]
+    last_pos = [None, -1, -1]
+    group_class = [None, DEAD, DEAD]
+
+    def close_group(stone):
+        cls = group_class[stone]
+        base = 0 if stone == 1 else 3
+        result[base] += CLASS_SCORES[cls]
+        if cls == FIVE:
+            result[base + 2] += 1
+        elif cls >= OPEN_THREE:
+            result[base + 1] += 1
+
+    for pos in range(length):
+        stone = (code >> (2 * (pos + half_window))) & 3
+        if stone == CELL_EMPTY:
+            continue
+        entry = table[(code >> (2 * pos)) & window_mask]
+        cls = entry & 15 if stone == 1 else entry >> 4
+
+        previous = last_pos[stone]
+        gap = pos - previous
+        between = (code >> (2 * (pos - 1 + half_window))) & 3
+        if previous >= 0 and (gap == 1 or (gap == 2 and between == CELL_EMPTY)):
+            if cls > group_class[stone]:
+                group_class[stone] = cls
+        else:
+            if previous >= 0:
+                close_group(stone)
+            group_class[stone] = cls
+        last_pos[stone] = pos
+
+    for stone in (1, 2):
+        if last_pos[stone] >= 0:
+            close_group(stone)
+    return tuple(result)
+
+
+def line_value(code):
+    """
+    Value of one line for both players, for WIN_CONSEC in a row:
+    (x_score, x_threats, x_fives, o_score, o_threats, o_fives). Cached.
+    """
+    return get_patterns(WIN_CONSEC)["line_value"](code)
@@ -0,0 +1,235 @@
+"""
+Headless self-play tournament between two engine configurations.
+
+Each configuration sets the search limits and the tunable globals in
+ai.py (defence weight, multi-threat bonus, moves searched per node,
+quiescence depth). Games are played in parallel worker processes; every
+opening is a few random stones near the centre and is played twice, once
+with each engine as X. Finished games are appended to a JSON-lines file as they
+come in, so a long run can be stopped and resumed with the same command:
+
+    python selfplay.py --games 200 --a max_depth=4 --b max_depth=4 defense_weight=2.0
+
+The report gives engine A's wins, draws and losses against B, and the Elo
+difference with a 95% confidence interval.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+import ai
+from ai import get_best_move_for, WIN_CONSEC
+from game_state import GameState
+from transposition import TranspositionTable
+
+BOARD_SIZE = 15         # default board size (--size)
+OPENING_STONES = 3      # random stones placed before the engines take over
+OPENING_RADIUS = 2      # ... within this distance of the centre
+SELFPLAY_TT_MB = 16     # Transposition table size for each engine in a game
+CONFIDENCE_Z = 1.96     # 95% confidence interval
+
+# Engine settings and their defaults; anything not given on the command line
+# keeps the value ai.py plays with
+ENGINE_DEFAULTS = {
+    "max_time": 1.0,
+    "max_depth": 4,
+    "max_moves": ai.MAX_MOVES,
+    "max_moves_shallow": ai.MAX_MOVES_SHALLOW,
+    "defense_weight": ai.DEFENSE_WEIGHT,
+    "multi_threat_bonus": ai.MULTI_THREAT_BONUS,
+    "quiescence_depth": ai.QUIESCENCE_DEPTH,
+}
+
+# Setting name -> ai.py global it overrides while that engine is to move
+_AI_GLOBALS = {
+    "max_moves": "MAX_MOVES",
+    "max_moves_shallow": "MAX_MOVES_SHALLOW",
+    "defense_weight": "DEFENSE_WEIGHT",
+    "multi_threat_bonus": "MULTI_THREAT_BONUS",
+    "quiescence_depth": "QUIESCENCE_DEPTH",
+}
+
+
+def parse_engine(settings):
+    """Engine config from KEY=VALUE strings, on top of ENGINE_DEFAULTS."""
+    config = dict(ENGINE_DEFAULTS)
+    for item in settings or []:
+        key, sep, value = item.partition("=")
+        if not sep or key not in ENGINE_DEFAULTS:
+            raise ValueError(f"unknown engine setting {item!r} (expected one of {', '.join(ENGINE_DEFAULTS)})")
+        config[key] = type(ENGINE_DEFAULTS[key])(value)
+    return config
+
+
+def make_opening(seed, size=BOARD_SIZE, stones=OPENING_STONES, radius=OPENING_RADIUS):
+    """A reproducible random opening: a list of (x, y), X first."""
+    rng = random.Random(seed)
+    centre = size // 2
+    cells = [(x, y) for x in range(centre - radius, centre + radius + 1)
+             for y in range(centre - radius, centre + radius + 1)]
+    return rng.sample(cells, stones)
+
+
+def _apply_engine(config):
+    for key, name in _AI_GLOBALS.items():
+        setattr(ai, name, config[key])
+
+
+def play_game(task):
+    """
+    Worker: play one game. task is (game index, opening seed, engine A, engine B,
+    board size, win length); A plays X in even-numbered games. Returns the game record.
+    """
+    index, seed, engine_a, engine_b, size, win_length = task
+    a_symbol = "X" if index % 2 == 0 else "O"
+    engines = {a_symbol: engine_a, ("O" if a_symbol == "X" else "X"): engine_b}
+    tables = {symbol: TranspositionTable(SELFPLAY_TT_MB) for symbol in engines}
+
+    game = GameState(size, win_length)
+    opening = make_opening(seed, size)
+    for x, y in opening:
+        game.play(x, y)
+
+    start = time.perf_counter()
+    while not game.game_over:
+        symbol = game.current_player
+        config = engines[symbol]
+        _apply_engine(config)
+        # Self-play games are untimed: each move gets the engine's own budget
+        move = get_best_move_for(
+            game, max_time=config["max_time"], max_depth=config["max_depth"], tt=tables[symbol],
+            book=False, time_left=None
+        )
+        if move is None:
+            break
+        game.play(*move)
+
+    winner = game.winner
+    if winner is None:
+        result = "draw"
+    else:
+        result = "A" if winner == a_symbol else "B"
+    return {
+        "game": index,
+        "seed": seed,
+        "a": a_symbol,
+        "engines": {"A": engine_a, "B": engine_b},
+        "size": size,
+        "win_length": win_length,
+        "opening": len(opening),
+        "moves": [[x, y] for x, y, _ in game.history],
+        "result": result,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def load_records(path, repair=False):
+    """
+    Game records already in path (a missing file has none). A line cut off by an
+    interrupted run is ignored, and with repair=True also removed from the file.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    good = 0
+    with open(path) as f:
+        for line in iter(f.readline, ""):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            good = f.tell()
+    if repair and good < os.path.getsize(path):
+        with open(path, "r+") as f:
+            f.truncate(good)
+    return records
+
+
+def elo_difference(wins, draws, losses):
+    """
+    Elo difference of the scoring side and its 95% confidence interval,
+    as (elo, low, high). Infinite when a side has scored every point.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, -math.inf, math.inf
+
+    def to_elo(score):
+        if score <= 0:
+            return -math.inf
+        if score >= 1:
+            return math.inf
+        return -400 * math.log10(1 / score - 1)
+
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = CONFIDENCE_Z * math.sqrt(variance / games)
+    return to_elo(score), to_elo(score - margin), to_elo(score + margin)
+
+
+def report(records):
+    """Print and return A's (wins, draws, losses) against B with the Elo estimate."""
+    wins = sum(1 for r in records if r["result"] == "A")
+    losses = sum(1 for r in records if r["result"] == "B")
+    draws = len(records) - wins - losses
+    elo, low, high = elo_difference(wins, draws, losses)
+    print(f"{len(records)} games: A {wins} wins, {draws} draws, {losses} losses")
+    print(f"Elo A - B: {elo:+.0f} (95% CI {low:+.0f} .. {high:+.0f})")
+    return wins, draws, losses
+
+
+def run_tournament(engine_a, engine_b, games, output, workers=None, seed=0, size=BOARD_SIZE, win_length=WIN_CONSEC):
+    """Play the games missing from output, appending each record as it finishes."""
+    records = load_records(output, repair=True)
+    for record in records:
+        if record["engines"] != {"A": engine_a, "B": engine_b}:
+            raise SystemExit(f"{output} holds games between other engine settings; use a new --output")
+        if (record.get("size", BOARD_SIZE), record.get("win_length", WIN_CONSEC)) != (size, win_length):
+            raise SystemExit(f"{output} holds games of another board size or win length; use a new --output")
+    done = {record["game"] for record in records}
+
+    # Games 2k and 2k+1 share an opening with the colours swapped
+    tasks = [(i, seed * 1000003 + i // 2, engine_a, engine_b, size, win_length) for i in range(games) if i not in done]
+    if done:
+        print(f"resuming: {len(done)} games already in {output}, {len(tasks)} to play")
+
+    with open(output, "a") as f, multiprocessing.Pool(workers) as pool:
+        for record in pool.imap_unordered(play_game, tasks):
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            records.append(record)
+            print(f"game {record['game']}: {record['result']} in {len(record['moves'])} moves")
+
+    return report(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Five in a Row self-play tournament")
+    parser.add_argument("--a", nargs="*", metavar="KEY=VALUE", help="engine A settings")
+    parser.add_argument("--b", nargs="*", metavar="KEY=VALUE", help="engine B settings")
+    parser.add_argument("--games", type=int, default=100, help="number of games (best even)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random openings")
+    parser.add_argument("--size", type=int, default=BOARD_SIZE, help="board size")
+    parser.add_argument("--win-length", type=int, default=WIN_CONSEC, help="stones in a row to win")
+    parser.add_argument("--output", default="selfplay.jsonl", help="game records (appended to, resumable)")
+    parser.add_argument("--report", action="store_true", help="only summarise the games already in --output")
+    args = parser.parse_args(argv)
+
+    if args.report:
+        report(load_records(args.output))
+        return
+    try:
+        engine_a, engine_b = parse_engine(args.a), parse_engine(args.b)
+    except ValueError as e:
+        parser.error(str(e))
+    run_tournament(engine_a, engine_b, args.games, args.output, args.workers, args.seed, args.size, args.win_length)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+The 8 symmetries of the square board (4 rotations, each optionally reflected).
+
+Positions that differ only by a rotation or reflection are equally good
+for the same side, so position stores can share one entry between them.
+BitBoard keeps the Zobrist hash of its position under every transform up
+to date on make/unmake (see BitBoard.canonical); the canonical hash is the
+smallest of the 8, and the transform that produced it maps moves into the
+canonical orientation (to_canonical) and back (from_canonical).
+"""
+
+# (x, y) -> (x', y') on an n x n board; index 0 is the identity
+TRANSFORMS = [
+    lambda x, y, n: (x, y),
+    lambda x, y, n: (n - 1 - y, x),
+    lambda x, y, n: (n - 1 - x, n - 1 - y),
+    lambda x, y, n: (y, n - 1 - x),
+    lambda x, y, n: (n - 1 - x, y),
+    lambda x, y, n: (x, n - 1 - y),
+    lambda x, y, n: (y, x),
+    lambda x, y, n: (n - 1 - y, n - 1 - x),
+]
+
+# size -> (forward, inverse) cell permutations, one list per transform
+_permutations = {}
+
+
+def permutations(size):
+    """(forward, inverse) cell-index permutations of the 8 transforms for a board size."""
+    perms = _permutations.get(size)
+    if perms is None:
+        forward = []
+        for transform in TRANSFORMS:
+            perm = [0] * (size * size)
+            for y in range(size):
+                for x in range(size):
+                    tx, ty = transform(x, y, size)
+                    perm[y * size + x] = ty * size + tx
+            forward.append(perm)
+        inverse = []
+        for perm in forward:
+            inv = [0] * len(perm)
+            for idx, target in enumerate(perm):
+                inv[target] = idx
+            inverse.append(inv)
+        perms = _permutations[size] = (forward, inverse)
+    return perms
+
+
+def to_canonical(idx, transform, size):
+    """Cell index of idx in the canonical orientation reached by transform."""
+    return permutations(size)[0][transform][idx]
+
+
+def from_canonical(idx, transform, size):
+    """Cell index on the actual board of the canonical-orientation cell idx."""
+    return permutations(size)[1][transform][idx]
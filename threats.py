@@ -0,0 +1,188 @@
+"""
+Threat-space search: finds forced wins that minimax is too shallow to see.
+
+VCF (victory by continuous fours) only tries attacking moves that make a
+four, so every defence is forced. VCT (victory by continuous threats) also
+allows live threes; the defender then gets every cell that would stop a
+four on the board, plus counter-fours of their own. Both solvers work on a
+BitBoard and read threat classes straight from its cell patterns. Each call
+has its own node budget, and solved positions are cached by canonical
+Zobrist hash, so rotated and reflected positions share an entry.
+"""
+
+from patterns import FIVE, FOUR, OPEN_THREE
+from symmetry import to_canonical, from_canonical
+
+# Plies (attacker and defender moves) each solver may look ahead
+VCF_DEPTH = 24
+VCT_DEPTH = 10
+
+# Nodes each solver may visit per call before giving up
+VCF_NODE_BUDGET = 2000
+VCT_NODE_BUDGET = 2000
+
+# Solved positions are dropped once the cache holds this many entries
+MAX_SOLVED = 200000
+
+# (canonical hash, board size, win length, attacker, vct) -> (depth searched, winning move in the canonical orientation or None)
+_solved = {}
+
+
+class _BudgetExceeded(Exception):
+    """Raised inside the solver when the node budget runs out."""
+
+
+def clear_cache():
+    """Forget every solved position."""
+    _solved.clear()
+
+
+def _scan(board, attacker, defender):
+    """
+    Best class each side gets by playing each candidate cell.
+    Returns (attacker fives, defender fives, attacker threats) where threats
+    are (class, idx) for cells where the attacker makes a live three or better.
+    """
+    att_shift = 0 if attacker == 1 else 4
+    def_shift = 4 - att_shift
+    patterns = board.cell_patterns
+    own_fives, opp_fives, threats = [], [], []
+    for idx in board.candidates:
+        base = idx * 4
+        own = opp = 0
+        for entry in patterns[base:base + 4]:
+            cls = (entry >> att_shift) & 15
+            if cls > own:
+                own = cls
+            cls = (entry >> def_shift) & 15
+            if cls > opp:
+                opp = cls
+        if own == FIVE:
+            own_fives.append(idx)
+        elif own >= OPEN_THREE:
+            threats.append((own, idx))
+        if opp == FIVE:
+            opp_fives.append(idx)
+    return own_fives, opp_fives, threats
+
+
+def _four_cells(board, stone):
+    """Candidate cells where stone would make a four (or five)."""
+    shift = 0 if stone == 1 else 4
+    patterns = board.cell_patterns
+    cells = []
+    for idx in board.candidates:
+        base = idx * 4
+        for entry in patterns[base:base + 4]:
+            if (entry >> shift) & 15 >= FOUR:
+                cells.append(idx)
+                break
+    return cells
+
+
+def _attack(board, attacker, defender, depth, vct, counter):
+    """Attacker to move: return a move that starts a forced win, else None."""
+    counter[0] -= 1
+    if counter[0] < 0:
+        raise _BudgetExceeded
+
+    own_fives, opp_fives, threats = _scan(board, attacker, defender)
+    if own_fives:
+        return own_fives[0]
+    if len(opp_fives) > 1 or depth <= 0:
+        return None
+
+    canonical_hash, transform = board.canonical()
+    key = (canonical_hash, board.size, board.win_length, attacker, vct)
+    known = _solved.get(key)
+    if known is not None and (known[1] is not None or known[0] >= depth):
+        return None if known[1] is None else from_canonical(known[1], transform, board.size)
+
+    min_class = OPEN_THREE if vct else FOUR
+    threats = [t for t in threats if t[0] >= min_class]
+    if opp_fives:
+        # The defender's four must be blocked, and the block has to be a threat too
+        threats = [t for t in threats if t[1] == opp_fives[0]]
+    # Fours first, strongest first
+    threats.sort(reverse=True)
+
+    result = None
+    for cls, idx in threats:
+        board.make(idx, attacker)
+        won = _defend(board, attacker, defender, depth - 1, vct, counter)
+        board.unmake()
+        if won:
+            result = idx
+            break
+
+    if len(_solved) >= MAX_SOLVED:
+        _solved.clear()
+    _solved[key] = (depth, None if result is None else to_canonical(result, transform, board.size))
+    return result
+
+
+def _defend(board, attacker, defender, depth, vct, counter):
+    """Defender to move after a threat: True if every defence still loses."""
+    counter[0] -= 1
+    if counter[0] < 0:
+        raise _BudgetExceeded
+
+    own_fives, opp_fives, _ = _scan(board, defender, attacker)
+    if own_fives:
+        return False  # defender completes five first
+    if len(opp_fives) >= 2:
+        return True   # open four or double four
+    if opp_fives:
+        defences = opp_fives
+    else:
+        # A live three: block any cell the attacker could make a four on, or counter with a four
+        defences = set(_four_cells(board, attacker))
+        defences.update(_four_cells(board, defender))
+        if not defences:
+            return False
+    if depth <= 0:
+        return False
+
+    for idx in defences:
+        board.make(idx, defender)
+        won = _attack(board, attacker, defender, depth - 1, vct, counter) is not None
+        board.unmake()
+        if not won:
+            return False
+    return True
+
+
+def _solve(board, attacker, defender, depth, vct, budget):
+    counter = [budget]
+    start = len(board.history)
+    try:
+        return _attack(board, attacker, defender, depth, vct, counter)
+    except _BudgetExceeded:
+        # Undo whatever the aborted search left on the board
+        while len(board.history) > start:
+            board.unmake()
+        return None
+
+
+def find_vcf(board, attacker, defender, depth=VCF_DEPTH, budget=VCF_NODE_BUDGET):
+    """First move of a win by continuous fours for attacker (to move), or None."""
+    return _solve(board, attacker, defender, depth, False, budget)
+
+
+def find_vct(board, attacker, defender, depth=VCT_DEPTH, budget=VCT_NODE_BUDGET):
+    """First move of a win by continuous fours and live threes for attacker (to move), or None."""
+    return _solve(board, attacker, defender, depth, True, budget)
+
+
+def find_forced_win(board, attacker, defender):
+    """
+    Look for a forced win for attacker (to move): VCF first, then VCT as long
+    as the defender has no VCF of their own to answer the threes with.
+    Returns the first move (cell index) or None.
+    """
+    move = find_vcf(board, attacker, defender)
+    if move is not None:
+        return move
+    if find_vcf(board, defender, attacker) is not None:
+        return None
+    return find_vct(board, attacker, defender)
@@ -7,7 +7,9 @@ import pygame
 
 from network import NetworkGame
 from menu import run_menu 
-from ai import get_best_move_iterative, get_priority_moves, check_winner_fast, clear_eval_cache, WIN_CONSEC
+from ai import get_best_move_for, get_priority_moves, predict_reply, clear_eval_cache, WIN_CONSEC
+from game_state import GameState, other
+from ai_worker import AISearch, Ponder
 
 # --- Path Helper for PyInstaller ---
 def resource_path(relative_path):
@@ -23,8 +25,9 @@ def resource_path(relative_path):
 
 # --- Configuration ---
 BOARD_SIZE = 15
+WIN_LENGTH = WIN_CONSEC  # Stones in a row to win; board size and win length are set per game (set_board_size)
 CELL_SIZE = 40
-# WIN_LENGTH = 5 # No longer needed here, uses ai.WIN_CONSEC
+MAX_BOARD_PIXEL = 640    # Larger boards shrink their cells to fit in this many pixels
 SIDE_PANEL_WIDTH = 220
 TOP_UI_HEIGHT = 60
 BOARD_PIXEL = BOARD_SIZE * CELL_SIZE
@@ -54,14 +57,103 @@ ui_font = pygame.font.SysFont("Arial", 24, bold=True)
 msg_font = pygame.font.SysFont("Arial", 40, bold=True)
 small_font = pygame.font.SysFont("Arial", 18) # 👈 NEW: For clock/status text
 
+
+def set_board_size(size=15, win_length=WIN_CONSEC):
+    """Set the board size and win length of the next game, resizing the window to fit."""
+    global BOARD_SIZE, WIN_LENGTH, CELL_SIZE, BOARD_PIXEL, WINDOW_WIDTH, WINDOW_HEIGHT, screen, font
+    BOARD_SIZE, WIN_LENGTH = size, win_length
+    CELL_SIZE = min(40, MAX_BOARD_PIXEL // size)
+    BOARD_PIXEL = BOARD_SIZE * CELL_SIZE
+    WINDOW_WIDTH = BOARD_PIXEL + SIDE_PANEL_WIDTH * 2
+    WINDOW_HEIGHT = BOARD_PIXEL + TOP_UI_HEIGHT
+    if screen.get_size() != (WINDOW_WIDTH, WINDOW_HEIGHT):
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    font = pygame.font.SysFont("Arial", int(CELL_SIZE / 1.3), bold=True)
+    clear_render_cache()
+    invalidate_screen()
+
+
+# --- Rendering Cache ---
+# draw_board blits one persistent surface instead of drawing every cell each frame
+grid_surface = None  # Empty board with its grid lines
+glyphs = {}          # "X"/"O" -> pre-rendered stone surface
+board_layer = None   # grid_surface plus the stones of layer_rows
+layer_rows = None    # The board as drawn on board_layer (one list per row)
+
+
+def clear_render_cache():
+    """Drop the cached surfaces (after the cell size or font changes)."""
+    global grid_surface, board_layer, layer_rows
+    grid_surface = None
+    board_layer = None
+    layer_rows = None
+    glyphs.clear()
+
+
+def build_render_cache():
+    """Pre-render the empty grid and the two stones at the current cell size."""
+    global grid_surface, board_layer, layer_rows
+    grid_surface = pygame.Surface((BOARD_PIXEL, BOARD_PIXEL)).convert()
+    grid_surface.fill(BG_COLOR)
+    for y in range(BOARD_SIZE):
+        for x in range(BOARD_SIZE):
+            pygame.draw.rect(grid_surface, GRID_COLOR, (x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE), 1)
+    for symbol, color in (("X", X_COLOR), ("O", O_COLOR)):
+        glyphs[symbol] = font.render(symbol, True, color)
+    board_layer = grid_surface.copy()
+    layer_rows = [[" "] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+
+
+def sync_board_layer():
+    """
+    Redraw the cells of board_layer whose stone differs from the board (placed, undone
+    or reset). Returns the redrawn cells as rects relative to the board.
+    """
+    if board_layer is None or len(layer_rows) != game.size:
+        build_render_cache()
+    changed = []
+    for y, row in enumerate(game.board):
+        drawn = layer_rows[y]
+        if row == drawn:
+            continue  # Compared in C; most rows never change
+        for x, symbol in enumerate(row):
+            if symbol != drawn[x]:
+                cell = pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+                board_layer.blit(grid_surface, cell, cell)
+                if symbol != " ":
+                    glyph = glyphs[symbol]
+                    board_layer.blit(glyph, glyph.get_rect(center=cell.center))
+                drawn[x] = symbol
+                changed.append(cell)
+    return changed
+
+
+# --- Dirty-Rectangle Rendering ---
+# render_frame redraws only the screen regions whose content changed since the last
+# frame and present_frame pushes just those rects to the display
+dirty_rects = []      # Screen areas redrawn this frame
+region_views = {}     # Region name -> what it showed when last drawn (empty: redraw everything)
+
+# --- Event-Driven Loop ---
+# Every game loop runs: game_events(), update, render_frame(), present_frame(). present_frame
+# sleeps in pygame.event.wait until input, a custom event posted by a worker thread, or
+# the loop's timeout (e.g. the next second of the running clock)
+MAX_FPS = 60          # Frames a second at most while events keep arriving
+AI_DONE_EVENT = pygame.event.custom_type()  # An AI search finished (posted by its thread)
+NETWORK_EVENT = pygame.event.custom_type()  # The network thread changed the game or connected
+pending_events = []   # The event that ended the last wait, returned by the next game_events()
+
+
+def invalidate_screen():
+    """Make the next render_frame redraw the whole window."""
+    region_views.clear()
+
 # Game state
-board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-current_player = "X"
-game_over = False
+game = GameState(BOARD_SIZE, WIN_LENGTH)  # The round on screen: board, turn, result and clocks
 popup_active = False
-winner = None
 pause_active = False
 
+# Match information shown in the side panels (points carry over between rounds)
 players = {
     "X": {"name": "Player 1", "color": X_COLOR, "points": 0},
     "O": {"name": "Player 2", "color": O_COLOR, "points": 0},
@@ -70,6 +162,10 @@ players = {
 # AI state flag
 ai_is_thinking = False # 👈 NEW: Flag to display "thinking"
 
+# Search statistics overlay in the AI's side panel (toggle with F3 in AI games)
+SHOW_SEARCH_STATS = False
+last_search_stats = None # ai.SearchStats of the AI's last searched move
+
 
 # --- Sound Effects Setup --- 👈 NEW
 try:
@@ -115,74 +211,101 @@ def toggle_music(current_settings):
 
 
 # --- Core Game Functions ---
+def shown_hover(hover_pos):
+    """hover_pos if that cell gets the hover highlight, else None."""
+    if hover_pos is None or popup_active:
+        return None
+    x, y = hover_pos
+    if game.is_legal(x, y):
+        return hover_pos
+    return None
+
+
+def draw_hover(hover_pos):
+    x, y = hover_pos
+    rect = pygame.Rect(SIDE_PANEL_WIDTH + x * CELL_SIZE, TOP_UI_HEIGHT + y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+    pygame.draw.rect(screen, HOVER_COLOR, rect)
+    pygame.draw.rect(screen, GRID_COLOR, rect, 1)
+
+
 def draw_board(hover_pos=None):
-    # ... (Keep this function as is)
-    board_left = SIDE_PANEL_WIDTH
-    board_top = TOP_UI_HEIGHT
-    pygame.draw.rect(screen, BG_COLOR, (board_left, board_top, BOARD_PIXEL, BOARD_PIXEL))
+    sync_board_layer()
+    screen.blit(board_layer, (SIDE_PANEL_WIDTH, TOP_UI_HEIGHT))
+    hover_pos = shown_hover(hover_pos)
+    if hover_pos is not None:
+        draw_hover(hover_pos)
 
-    for y in range(BOARD_SIZE):
-        for x in range(BOARD_SIZE):
-            rect = pygame.Rect(board_left + x * CELL_SIZE, board_top + y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            if hover_pos == (x, y) and board[y][x] == " " and not game_over and not popup_active:
-                pygame.draw.rect(screen, HOVER_COLOR, rect)
-            pygame.draw.rect(screen, GRID_COLOR, rect, 1)
-            symbol = board[y][x]
-            if symbol != " ":
-                color = X_COLOR if symbol == "X" else O_COLOR
-                text = font.render(symbol, True, color)
-                text_rect = text.get_rect(center=rect.center)
-                screen.blit(text, text_rect)
-
-
-def check_win(x, y, player):
-    # This is a redundant function now, but keep for compatibility with player move
-    directions = [(1, 0), (0, 1), (1, 1), (1, -1)]
-    for dx, dy in directions:
-        count = 1
-        for dir in [1, -1]:
-            nx, ny = x + dx * dir, y + dy * dir
-            while 0 <= nx < BOARD_SIZE and 0 <= ny < BOARD_SIZE and board[ny][nx] == player:
-                count += 1
-                nx += dx * dir
-                ny += dy * dir
-        if count >= WIN_CONSEC:
-            return True
-    return False
 
 # --- AI Integration (Constants and Function) ---
 AI_PLAYER = "O"
 HUMAN_PLAYER = "X"
+PONDER = True  # Search on the human's time (Medium/Hard)
+
+def ai_move(difficulty=0, state=None, cancel=None, ponder=None):
+    """
+    Delegates AI move selection based on difficulty.
+    state is the GameState to search (defaults to the live game; pass a copy when searching
+    on a worker thread), cancel is the search's cancellation token and ponder the
+    ai_worker.Ponder token of a search started on the human's time.
+    """
+    if state is None:
+        state = game
 
-def ai_move(difficulty=0):
-    """Delegates AI move selection based on difficulty."""
     if difficulty == 0:
         # Simple Random Move
-        empty_cells = [(x, y) for y in range(BOARD_SIZE) for x in range(BOARD_SIZE) if board[y][x] == " "]
+        empty_cells = [(x, y) for y in range(state.size) for x in range(state.size) if state.board[y][x] == " "]
         return random.choice(empty_cells) if empty_cells else None
     
     # Minimax based moves
     if difficulty == 1:
         # Easy/Medium: Use move ordering and depth 1 search for speed
-        moves = get_priority_moves(board, AI_PLAYER, HUMAN_PLAYER, BOARD_SIZE, max_moves=5)
+        moves = get_priority_moves(state.board, AI_PLAYER, HUMAN_PLAYER, state.size, max_moves=5, win_length=state.win_length)
         if moves:
             # Check the best move without full minimax for speed
             return moves[0]
         
     elif difficulty >= 2:
         # Hard: Use iterative deepening minimax (up to 4 seconds, max depth 6)
-        # We pass the board by reference (mutating is fine since minimax_optimized handles unmaking moves)
-        return get_best_move_iterative(
-            board, AI_PLAYER, HUMAN_PLAYER, BOARD_SIZE, 
+        # The search runs on its own bitboard built from state, so state itself is never mutated
+        global last_search_stats
+        want_stats = SHOW_SEARCH_STATS  # read once: F3 can flip it while this search runs
+        result = get_best_move_for(
+            state, player=AI_PLAYER,
             max_time=4.0 if difficulty == 3 else 2.0, 
-            max_depth=6 if difficulty == 3 else 4
+            max_depth=6 if difficulty == 3 else 4,
+            cancel=cancel, ponder=ponder,
+            return_stats=want_stats
         )
+        if want_stats:
+            result, last_search_stats = result
+        return result
     
     # Fallback
-    empty_cells = [(x, y) for y in range(BOARD_SIZE) for x in range(BOARD_SIZE) if board[y][x] == " "]
+    empty_cells = [(x, y) for y in range(state.size) for x in range(state.size) if state.board[y][x] == " "]
     return random.choice(empty_cells) if empty_cells else None
 
 
+def start_ai_move(difficulty=0):
+    """Start ai_move on a worker thread over a snapshot of the game; returns an AISearch handle."""
+    return AISearch(ai_move, difficulty, game.copy(), on_done=lambda: post_event(AI_DONE_EVENT))
+
+
+def start_ponder(difficulty=0):
+    """
+    Start searching the AI's answer to the human's expected reply while the human thinks.
+    Returns (AISearch handle, Ponder token), or (None, None) if there is nothing to ponder.
+    """
+    if not PONDER or difficulty < 2:
+        return None, None
+    expected = predict_reply(game.board, AI_PLAYER, HUMAN_PLAYER, game.size, win_length=game.win_length)
+    if expected is None:
+        return None, None
+    state = game.copy()
+    state.play(expected[0], expected[1], HUMAN_PLAYER)
+    ponder = Ponder(expected)
+    return AISearch(ai_move, difficulty, state, ponder=ponder, on_done=lambda: post_event(AI_DONE_EVENT)), ponder
+
+
 # --- UI Functions ---
 def format_time(seconds):
     """Converts seconds to M:SS format."""
@@ -191,10 +314,24 @@ def format_time(seconds):
     return f"{mins}:{secs:02d}"
 
 
-def draw_player_panel(side, player_symbol):
+def panel_rect_for(side):
+    if side == "left":
+        return pygame.Rect(0, TOP_UI_HEIGHT, SIDE_PANEL_WIDTH, BOARD_PIXEL)
+    return pygame.Rect(WINDOW_WIDTH - SIDE_PANEL_WIDTH, TOP_UI_HEIGHT, SIDE_PANEL_WIDTH, BOARD_PIXEL)
+
+
+def panel_status(player_symbol):
+    """(text, color) of the turn indicator under a player's clock."""
+    if game.current_player == player_symbol and not popup_active and not pause_active:
+        if player_symbol == "O" and players[player_symbol]["name"] == "Computer" and ai_is_thinking:
+            return "thinking...", (150, 0, 150) # Purple when thinking
+        return "YOUR TURN", (0, 150, 0) # Green for active
+    return "", (0, 150, 0)
+
+
+def draw_player_panel(side, player_symbol, footer=None):
     data = players[player_symbol]
-    panel_rect = pygame.Rect(0, TOP_UI_HEIGHT, SIDE_PANEL_WIDTH, BOARD_PIXEL) if side == "left" else \
-                 pygame.Rect(WINDOW_WIDTH - SIDE_PANEL_WIDTH, TOP_UI_HEIGHT, SIDE_PANEL_WIDTH, BOARD_PIXEL)
+    panel_rect = panel_rect_for(side)
 
     pygame.draw.rect(screen, PANEL_COLOR, panel_rect)
     pygame.draw.rect(screen, SEPARATOR_COLOR, panel_rect, 2)
@@ -207,29 +344,60 @@ def draw_player_panel(side, player_symbol):
     screen.blit(points_text, (panel_rect.centerx - points_text.get_width() // 2, panel_rect.top + 150))
     
     # --- Clock Display ---
-    time_color = O_COLOR if data['time_left'] < 60 else TEXT_COLOR # Red if less than 60s
-    time_text = ui_font.render(format_time(data['time_left']), True, time_color)
+    time_left = game.time_left[player_symbol]
+    time_color = O_COLOR if time_left < 60 else TEXT_COLOR # Red if less than 60s
+    time_text = ui_font.render(format_time(time_left), True, time_color)
     screen.blit(time_text, (panel_rect.centerx - time_text.get_width() // 2, panel_rect.top + 210))
     
     # --- Status Indicator ---
-    status_text = ""
-    status_color = (0, 150, 0) # Green for active
-    
-    if current_player == player_symbol and not popup_active and not pause_active:
-        if player_symbol == "O" and data["name"] == "Computer" and ai_is_thinking:
-            status_text = "thinking..."
-            status_color = (150, 0, 150) # Purple when thinking
-        else:
-            status_text = "YOUR TURN"
-    
+    status_text, status_color = panel_status(player_symbol)
     status_surface = small_font.render(status_text, True, status_color)
     screen.blit(status_surface, status_surface.get_rect(center=(panel_rect.centerx, panel_rect.top + 250)))
 
+    if SHOW_SEARCH_STATS and data["name"] == "Computer":
+        draw_search_stats(panel_rect)
+
+    if footer:
+        footer_text = small_font.render(footer, True, (100, 100, 100))
+        screen.blit(footer_text, (30, panel_rect.bottom - 30))
+
+
+def draw_search_stats(panel_rect):
+    """Debug overlay: statistics of the AI's last search, under the AI's clock."""
+    stats = last_search_stats
+    if stats is None:
+        lines = ["no search yet"]
+    else:
+        nps = int(stats.nodes / stats.time) if stats.time > 0 else 0
+        lines = [
+            f"{stats.reason}: depth {stats.depth_reached()}",
+            f"time {stats.time:.2f}s",
+            f"nodes {stats.nodes} ({nps}/s)",
+            f"leaf evals {stats.leaf_evals}",
+            f"TT hits {stats.tt_hit_rate():.0%} ({stats.tt_cutoffs} cut)",
+            f"1st-move cutoffs {stats.first_move_cutoff_rate():.0%}",
+        ]
+        for depth, seconds, nodes, _, move in stats.depths[-4:]:
+            lines.append(f"d{depth} {seconds:.2f}s {nodes}n {move}")
+        if stats.pv:
+            lines.append("PV " + " ".join(f"{x},{y}" for x, y in stats.pv[:4]))
+
+    y = panel_rect.top + 285
+    for line in lines:
+        text = small_font.render(line, True, TEXT_COLOR)
+        screen.blit(text, (panel_rect.left + 10, y))
+        y += 22
+
+
+def top_ui_rects():
+    """(pause button, exit button) of the top bar."""
+    return (pygame.Rect(WINDOW_WIDTH // 2 - 60, 10, 120, 40),
+            pygame.Rect(WINDOW_WIDTH - SIDE_PANEL_WIDTH + 20, 10, 120, 40))
+
 
 def draw_top_ui(mouse_pos):
     pygame.draw.rect(screen, (220, 220, 220), (0, 0, WINDOW_WIDTH, TOP_UI_HEIGHT))
-    pause_rect = pygame.Rect(WINDOW_WIDTH // 2 - 60, 10, 120, 40)
-    exit_rect = pygame.Rect(WINDOW_WIDTH - SIDE_PANEL_WIDTH + 20, 10, 120, 40)
+    pause_rect, exit_rect = top_ui_rects()
 
     pause_color = BUTTON_HOVER if pause_rect.collidepoint(mouse_pos) else BUTTON_COLOR
     exit_color = EXIT_HOVER if exit_rect.collidepoint(mouse_pos) else EXIT_COLOR
@@ -244,15 +412,26 @@ def draw_top_ui(mouse_pos):
     screen.blit(exit_text, exit_text.get_rect(center=exit_rect.center))
     
     # Draw Turn Info in Center
-    if not game_over and not pause_active:
-        turn_text_str = f"{players[current_player]['name']}'s Turn"
-        turn_text = ui_font.render(turn_text_str, True, players[current_player]["color"])
+    if not game.game_over and not pause_active:
+        turn_text_str = f"{players[game.current_player]['name']}'s Turn"
+        turn_text = ui_font.render(turn_text_str, True, players[game.current_player]["color"])
         screen.blit(turn_text, turn_text.get_rect(center=(SIDE_PANEL_WIDTH // 2, 30)))
 
 
     return pause_rect, exit_rect
 
 
+def popup_button_rect():
+    """The win popup's Continue button."""
+    return pygame.Rect(WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 + 10, 200, 60)
+
+
+def pause_popup_rects():
+    """(Continue, Main Menu) buttons of the pause popup."""
+    return (pygame.Rect(WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 - 10, 200, 60),
+            pygame.Rect(WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 + 70, 200, 60))
+
+
 def show_popup(winner):
     overlay = pygame.Surface((BOARD_PIXEL, BOARD_PIXEL))
     overlay.set_alpha(200)
@@ -263,7 +442,7 @@ def show_popup(winner):
     title_rect = title.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 40))
     screen.blit(title, title_rect)
 
-    button_rect = pygame.Rect(WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 + 10, 200, 60)
+    button_rect = popup_button_rect()
     mouse_pos = pygame.mouse.get_pos()
     color = BUTTON_HOVER if button_rect.collidepoint(mouse_pos) else BUTTON_COLOR
     pygame.draw.rect(screen, color, button_rect, border_radius=10)
@@ -282,8 +461,7 @@ def show_pause_popup():
     title = msg_font.render("⏸ Paused", True, TEXT_COLOR)
     screen.blit(title, title.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 80)))
 
-    cont_btn = pygame.Rect(WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 - 10, 200, 60)
-    menu_btn = pygame.Rect(WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 + 70, 200, 60)
+    cont_btn, menu_btn = pause_popup_rects()
     mouse_pos = pygame.mouse.get_pos()
 
     for rect, text in [(cont_btn, "Continue"), (menu_btn, "Main Menu")]:
@@ -295,6 +473,129 @@ def show_pause_popup():
     return cont_btn, menu_btn
 
 
+def panel_view(player_symbol, footer=None):
+    """Everything draw_player_panel shows, to tell when the panel needs redrawing."""
+    data = players[player_symbol]
+    stats = last_search_stats if SHOW_SEARCH_STATS and data["name"] == "Computer" else False
+    time_left = game.time_left[player_symbol]
+    return (player_symbol, data["name"], data["points"], format_time(time_left),
+            time_left < 60, panel_status(player_symbol), stats, footer)
+
+
+def render_frame(mouse_pos, hover_cell, left_symbol, right_symbol, footer=None, popups=True, overlay=None):
+    """
+    Draw a game frame, redrawing only what changed since the last one and marking it
+    in dirty_rects. footer is a line at the bottom of the left panel; popups=False hides
+    the win and pause popups; overlay is (view, draw) for a mode's own overlay, where
+    draw paints it over the frame and view tells when it changed. While any popup or
+    overlay is up, a change anywhere redraws the whole window.
+    """
+    pause_rect, exit_rect = top_ui_rects()
+    turn = None if game.game_over or pause_active else (players[game.current_player]["name"], game.current_player)
+    views = {
+        "top": (pause_rect.collidepoint(mouse_pos), exit_rect.collidepoint(mouse_pos), turn),
+        "left": panel_view(left_symbol, footer),
+        "right": panel_view(right_symbol),
+        "popup": None,
+        "overlay": overlay[0] if overlay else None,
+    }
+    if popups and popup_active:
+        views["popup"] = ("win", game.winner, popup_button_rect().collidepoint(mouse_pos))
+    elif popups and pause_active:
+        views["popup"] = ("pause",) + tuple(rect.collidepoint(mouse_pos) for rect in pause_popup_rects())
+    hover = shown_hover(hover_cell)
+    changed_cells = sync_board_layer()
+    changed = [name for name, view in views.items() if region_views.get(name, ()) != view]
+    hover_changed = region_views.get("hover") != hover
+    covered = views["popup"] is not None or views["overlay"] is not None
+
+    if (not region_views or "popup" in changed or "overlay" in changed
+            or (covered and (changed or changed_cells or hover_changed))):
+        screen.fill(BG_COLOR)
+        draw_top_ui(mouse_pos)
+        draw_player_panel("left", left_symbol, footer)
+        draw_player_panel("right", right_symbol)
+        draw_board(hover_cell)
+        if views["popup"] is not None:
+            if popup_active:
+                show_popup(game.winner)
+            else:
+                show_pause_popup()
+        if overlay:
+            overlay[1]()
+        dirty_rects.append(screen.get_rect())
+    else:
+        regions = {"top": (pygame.Rect(0, 0, WINDOW_WIDTH, TOP_UI_HEIGHT), lambda: draw_top_ui(mouse_pos)),
+                   "left": (panel_rect_for("left"), lambda: draw_player_panel("left", left_symbol, footer)),
+                   "right": (panel_rect_for("right"), lambda: draw_player_panel("right", right_symbol))}
+        for name in changed:
+            rect, draw = regions[name]
+            screen.set_clip(rect)
+            draw()
+            screen.set_clip(None)
+            dirty_rects.append(rect)
+
+        # Board: cells whose stone changed, and the old and new hover cells
+        cells = list(changed_cells)
+        if hover_changed:
+            for pos in (region_views.get("hover"), hover):
+                if pos is not None:
+                    cells.append(pygame.Rect(pos[0] * CELL_SIZE, pos[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+        for cell in cells:
+            target = cell.move(SIDE_PANEL_WIDTH, TOP_UI_HEIGHT)
+            screen.blit(board_layer, target, cell)
+            dirty_rects.append(target)
+        if hover is not None and cells:
+            draw_hover(hover)
+
+    region_views.update(views)
+    region_views["hover"] = hover
+
+
+def post_event(event_type):
+    """Wake the game loop from another thread."""
+    try:
+        pygame.event.post(pygame.event.Event(event_type))
+    except pygame.error:
+        pass  # pygame already shut down
+
+
+def game_events():
+    """Events since the last frame, starting with the one that woke the loop."""
+    events = pending_events + pygame.event.get()
+    pending_events.clear()
+    if any(event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED) for event in events):
+        invalidate_screen()  # The window system lost what was on screen
+    return events
+
+
+def wait_for_event(timeout=None):
+    """Sleep until an event arrives (kept for game_events) or timeout ms pass (None: no limit)."""
+    event = pygame.event.wait() if timeout is None else pygame.event.wait(max(1, int(timeout)))
+    if event.type != pygame.NOEVENT:
+        pending_events.append(event)
+
+
+def clock_timeout(symbol):
+    """Milliseconds until symbol's running clock shows the next second (None: no clock running)."""
+    if symbol is None:
+        return None
+    time_left = game.time_left[symbol]
+    return (time_left - math.floor(time_left)) * 1000 + 1
+
+
+def present_frame(clock, timeout=None):
+    """
+    Push the rects redrawn this frame to the display, then sleep until the next event
+    or timeout ms (None: until an event). Frames are capped at MAX_FPS.
+    """
+    if dirty_rects:
+        pygame.display.update(dirty_rects)
+        dirty_rects.clear()
+    clock.tick(MAX_FPS)
+    wait_for_event(timeout)
+
+
 # Using a simplified check based on the global 'settings' variable:
 def play_sfx(sound_key, current_settings):
     """Plays a sound if SFX are enabled in settings."""
@@ -304,9 +605,10 @@ def play_sfx(sound_key, current_settings):
 
 def run_game_ai(saved_state=None, difficult=0, human_symbol="X", game_settings=None):
     """
-    Play vs AI. human_symbol is "X" or "O". game_settings is a dict { 'sfx': bool, 'music': bool }.
+    Play vs AI. human_symbol is "X" or "O". game_settings is a dict
+    { 'sfx': bool, 'music': bool, 'board_size': int, 'win_length': int }.
     """
-    global board, current_player, game_over, popup_active, pause_active, winner, ai_is_thinking, HUMAN_PLAYER, AI_PLAYER
+    global game, popup_active, pause_active, ai_is_thinking, HUMAN_PLAYER, AI_PLAYER, SHOW_SEARCH_STATS
     start_symbol = "X"
 
     if game_settings is None:
@@ -318,24 +620,19 @@ def run_game_ai(saved_state=None, difficult=0, human_symbol="X", game_settings=N
 
     # --- Restore or new game setup ---
     if saved_state:
-        board = [row[:] for row in saved_state["board"]]
-        current_player = saved_state["current_player"]
+        game = saved_state["game"].copy()
+        set_board_size(game.size, game.win_length)
         players.update(saved_state["players"])
-        game_over = saved_state["game_over"]
         popup_active = False
         pause_active = False
-        winner = None
     else:
-        board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        current_player = "X"  # X starts by default
-        game_over = False
+        set_board_size(game_settings.get("board_size", 15), game_settings.get("win_length", WIN_CONSEC))
+        game = GameState(BOARD_SIZE, WIN_LENGTH)  # X starts by default
         popup_active = False
         pause_active = False
-        winner = None
-        players["X"]["time_left"] = 300
-        players["O"]["time_left"] = 300
         players["X"]["name"] = "Player"
         players["O"]["name"] = "Computer"
+        clear_eval_cache()  # fresh game: drop positions remembered from the last one
 
     # start/restore music
     if game_settings.get("music", True):
@@ -345,13 +642,20 @@ def run_game_ai(saved_state=None, difficult=0, human_symbol="X", game_settings=N
     running = True
     ai_should_move = False
     ai_is_thinking = False
+    ai_search = None  # AISearch handle while the AI is thinking
+    ponder_search, ponder = None, None  # search on the human's time and its Ponder token
     last_tick_time = pygame.time.get_ticks()
 
+    def cancel_searches():
+        """Stop the running searches and wait until they no longer touch the shared tables."""
+        searches = [search for search in (ai_search, ponder_search) if search is not None]
+        for search in searches:
+            search.cancel()
+        for search in searches:
+            search.result()
+
 
     while running:
-        # If AI should move first (human chose O)
-        if current_player == AI_PLAYER:
-            ai_should_move = True
         # --- Time (delta) ---
         now = pygame.time.get_ticks()
         dt = (now - last_tick_time) / 1000.0
@@ -365,18 +669,12 @@ def run_game_ai(saved_state=None, difficult=0, human_symbol="X", game_settings=N
             pygame.mixer.music.unpause()
 
         # --- Timer countdown (only for human when appropriate) ---
-        if not game_over and not popup_active and not pause_active and not ai_is_thinking:
-            # only decrement the current player's timer; if it's AI's turn, don't subtract human's time
-            if current_player in players:
-                # in AI mode we only decrement human's timer when it's their turn
-                if (current_player == HUMAN_PLAYER) or (current_player != AI_PLAYER and not True):
-                    players[current_player]["time_left"] = max(0, players[current_player]["time_left"] - dt)
-                    if players[current_player]["time_left"] <= 0:
-                        # human ran out of time -> AI wins
-                        game_over = True
-                        popup_active = True
-                        winner = AI_PLAYER
-                        players[winner]["points"] += 1
+        # in AI mode we only decrement human's timer when it's their turn
+        if not popup_active and not pause_active and not ai_is_thinking and game.current_player == HUMAN_PLAYER:
+            if game.tick(dt):
+                # human ran out of time -> AI wins
+                popup_active = True
+                players[game.winner]["points"] += 1
 
         # --- Draw UI ---
         mouse_pos = pygame.mouse.get_pos()
@@ -385,74 +683,46 @@ def run_game_ai(saved_state=None, difficult=0, human_symbol="X", game_settings=N
             hover_cell = ((mouse_pos[0] - SIDE_PANEL_WIDTH) // CELL_SIZE,
                           (mouse_pos[1] - TOP_UI_HEIGHT) // CELL_SIZE)
 
-        screen.fill(BG_COLOR)
-        pause_rect, exit_rect = draw_top_ui(mouse_pos)
-        # left panel should show the human_symbol
-        draw_player_panel("left", HUMAN_PLAYER)
-        draw_player_panel("right", AI_PLAYER)
-        draw_board(hover_cell)
-
-        if popup_active:
-            continue_rect = show_popup(winner)
-        elif pause_active:
-            cont_rect, menu_rect = show_pause_popup()
-
-        # --- AI logic (deferred to main loop so UI updates before compute) ---
-        if ai_should_move and not game_over:
-            ai_is_thinking = True
-            pygame.display.flip()
-            pygame.time.wait(150)  # small breathing room
-
-            clear_eval_cache()
-            move = ai_move(difficulty=difficult)
-            ai_is_thinking = False
-
-            if move:
-                mx, my = move
-                board[my][mx] = AI_PLAYER
-                if check_win(mx, my, AI_PLAYER):
-                    players[AI_PLAYER]["points"] += 1
-                    game_over = True
-                    popup_active = True
-                    winner = AI_PLAYER
-                    if game_settings.get("sfx", True):
-                        play_sfx("win", game_settings)
-                else:
-                    current_player = HUMAN_PLAYER
-            ai_should_move = False
+        pause_rect, exit_rect = top_ui_rects()
+        continue_rect = popup_button_rect()
+        cont_rect, menu_rect = pause_popup_rects()
 
         # --- Event handling ---
-        for event in pygame.event.get():
+        for event in game_events():
             if event.type == pygame.QUIT:
+                cancel_searches()
                 if game_settings.get("music", True):
                     stop_music()
                 pygame.quit()
                 sys.exit()
 
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                SHOW_SEARCH_STATS = not SHOW_SEARCH_STATS
+
             if popup_active and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 if continue_rect.collidepoint(event.pos):
                     # reset for next round — keep human/ai symbols stable
-                    board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-                    game_over = False
                     popup_active = False
-                    winner = None
-                    start_symbol = "O" if start_symbol == "X" else "X"
-                    current_player = start_symbol
+                    start_symbol = other(start_symbol)
+                    game.reset(start_symbol)
                     ai_should_move = False
-                    players["X"]["time_left"] = 300
-                    players["O"]["time_left"] = 300
+                    # A ponder hit can still be searching the last round; it must not move in this one
+                    cancel_searches()
+                    ai_search, ponder_search, ponder = None, None, None
+                    ai_is_thinking = False
+                    clear_eval_cache()
 
             elif pause_active and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 if cont_rect.collidepoint(event.pos):
                     pause_active = False
                 elif menu_rect.collidepoint(event.pos):
+                    # Drop the running searches; the AI searches again when the game is resumed
+                    cancel_searches()
                     if game_settings.get("music", True):
                         stop_music()
                     saved_state = {
-                        "board": [row[:] for row in board],
-                        "current_player": current_player,
+                        "game": game.copy(),
                         "players": {p: data.copy() for p, data in players.items()},
-                        "game_over": game_over,
                     }
                     return ("menu", saved_state)
 
@@ -460,30 +730,74 @@ def run_game_ai(saved_state=None, difficult=0, human_symbol="X", game_settings=N
                 if pause_rect.collidepoint(event.pos):
                     pause_active = True
                 elif exit_rect.collidepoint(event.pos):
+                    cancel_searches()
                     if game_settings.get("music", True):
                         stop_music()
                     pygame.quit()
                     sys.exit()
-                elif not game_over and not popup_active and not pause_active and hover_cell:
+                elif not popup_active and not pause_active and hover_cell:
                     x, y = hover_cell
                     # Only allow human to play on their turns
-                    if board[y][x] == " " and current_player == HUMAN_PLAYER:
-                        board[y][x] = HUMAN_PLAYER
+                    if game.is_legal(x, y) and game.current_player == HUMAN_PLAYER:
+                        won = game.play(x, y)
+                        if ponder_search is not None:
+                            if ponder.expected_move == (x, y):
+                                # Ponder hit: the search already running becomes the AI's move search
+                                ponder.hit()
+                                ai_search = ponder_search
+                                ai_is_thinking = True
+                            else:
+                                # Miss: stop it (the real search reuses its transposition table)
+                                ponder_search.cancel()
+                                ponder_search.result()
+                            ponder_search, ponder = None, None
                         if game_settings.get("sfx", True):
                             play_sfx("place", game_settings)
-                        if check_win(x, y, HUMAN_PLAYER):
+                        if won:
                             players[HUMAN_PLAYER]["points"] += 1
-                            game_over = True
                             popup_active = True
-                            winner = HUMAN_PLAYER
                             if game_settings.get("sfx", True):
                                 play_sfx("win", game_settings)
-                        else:
-                            current_player = AI_PLAYER
+                        elif not game.game_over:
                             ai_should_move = True  # AI will move next
 
-        pygame.display.flip()
-        clock.tick(60)
+        # --- AI logic (searched on a worker thread, which posts AI_DONE_EVENT when it finishes) ---
+        # If AI should move first (human chose O)
+        if game.current_player == AI_PLAYER:
+            ai_should_move = True
+        # Nothing left to ponder once the round is over (e.g. the human ran out of time)
+        if game.game_over and ponder_search is not None:
+            ponder_search.cancel()
+            ponder_search, ponder = None, None
+        if ai_should_move and not game.game_over and ai_search is None:
+            ai_is_thinking = True
+            ai_search = start_ai_move(difficulty=difficult)
+
+        # Hold the finished move back while the game is paused
+        if ai_search is not None and ai_search.done() and not pause_active:
+            move = ai_search.result()
+            ai_search = None
+            ai_is_thinking = False
+
+            # (a ponder hit can finish after the human's move already ended the round)
+            if move and not game.game_over:
+                mx, my = move
+                if game.play(mx, my, AI_PLAYER):
+                    players[AI_PLAYER]["points"] += 1
+                    popup_active = True
+                    if game_settings.get("sfx", True):
+                        play_sfx("win", game_settings)
+                elif not game.game_over:
+                    # Think about the answer to the human's expected reply in the meantime
+                    ponder_search, ponder = start_ponder(difficulty=difficult)
+            ai_should_move = False
+
+        # left panel should show the human_symbol
+        render_frame(mouse_pos, hover_cell, HUMAN_PLAYER, AI_PLAYER)
+        # Sleep until input, the AI's move or the human's clock reaching its next second
+        human_clock = not game.game_over and not popup_active and not pause_active and not ai_is_thinking \
+            and game.current_player == HUMAN_PLAYER
+        present_frame(clock, clock_timeout(HUMAN_PLAYER if human_clock else None))
 
 
 def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
@@ -491,7 +805,7 @@ def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
     Two players on the same computer. human_symbol is the symbol to display on the left panel (informational).
     game_settings controls SFX/music (used if you want sounds in PvP).
     """
-    global board, current_player, game_over, popup_active, pause_active, winner
+    global game, popup_active, pause_active
     start_symbol = "X"
 
     if game_settings is None:
@@ -499,22 +813,16 @@ def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
 
     # initialize or restore
     if saved_state:
-        board = [row[:] for row in saved_state["board"]]
-        current_player = saved_state["current_player"]
+        game = saved_state["game"].copy()
+        set_board_size(game.size, game.win_length)
         players.update(saved_state["players"])
-        game_over = saved_state["game_over"]
         popup_active = False
         pause_active = False
-        winner = None
     else:
-        board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        current_player = start_symbol
-        game_over = False
+        set_board_size(game_settings.get("board_size", 15), game_settings.get("win_length", WIN_CONSEC))
+        game = GameState(BOARD_SIZE, WIN_LENGTH, first=start_symbol)
         popup_active = False
         pause_active = False
-        winner = None
-        players["X"]["time_left"] = 300
-        players["O"]["time_left"] = 300
         # set display names
         players["X"]["name"] = "Player 1 (X)" if human_symbol == "X" else "Player 2 (X)"
         players["O"]["name"] = "Player 2 (O)" if human_symbol == "X" else "Player 1 (O)"
@@ -541,14 +849,9 @@ def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
             pygame.mixer.music.unpause()
 
         # --- Timer countdown for current player ---
-        if not game_over and not popup_active and not pause_active:
-            if current_player in players:
-                players[current_player]["time_left"] = max(0, players[current_player]["time_left"] - dt)
-                if players[current_player]["time_left"] <= 0:
-                    game_over = True
-                    popup_active = True
-                    winner = "O" if current_player == "X" else "X"
-                    players[winner]["points"] += 1
+        if not popup_active and not pause_active and game.tick(dt):
+            popup_active = True
+            players[game.winner]["points"] += 1
 
         # --- Draw UI ---
         mouse_pos = pygame.mouse.get_pos()
@@ -557,20 +860,12 @@ def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
             hover_cell = ((mouse_pos[0] - SIDE_PANEL_WIDTH) // CELL_SIZE,
                           (mouse_pos[1] - TOP_UI_HEIGHT) // CELL_SIZE)
 
-        screen.fill(BG_COLOR)
-        pause_rect, exit_rect = draw_top_ui(mouse_pos)
-        # left panel shows the player assigned to human_symbol for clarity
-        draw_player_panel("left", human_symbol)
-        draw_player_panel("right", "O" if human_symbol == "X" else "X")
-        draw_board(hover_cell)
-
-        if popup_active:
-            continue_rect = show_popup(winner)
-        elif pause_active:
-            cont_rect, menu_rect = show_pause_popup()
+        pause_rect, exit_rect = top_ui_rects()
+        continue_rect = popup_button_rect()
+        cont_rect, menu_rect = pause_popup_rects()
 
         # --- Events ---
-        for event in pygame.event.get():
+        for event in game_events():
             if event.type == pygame.QUIT:
                 if game_settings.get("music", True):
                     stop_music()
@@ -579,14 +874,9 @@ def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
 
             if popup_active and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 if continue_rect.collidepoint(event.pos):
-                    board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-                    start_symbol = "O" if start_symbol == "X" else "X"
-                    current_player = start_symbol
-                    game_over = False
+                    start_symbol = other(start_symbol)
+                    game.reset(start_symbol)
                     popup_active = False
-                    winner = None
-                    players["X"]["time_left"] = 300
-                    players["O"]["time_left"] = 300
 
             elif pause_active and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 if cont_rect.collidepoint(event.pos):
@@ -595,10 +885,8 @@ def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
                     if game_settings.get("music", True):
                         stop_music()
                     saved_state = {
-                        "board": [row[:] for row in board],
-                        "current_player": current_player,
+                        "game": game.copy(),
                         "players": {p: data.copy() for p, data in players.items()},
-                        "game_over": game_over,
                     }
                     return ("menu", saved_state)
 
@@ -610,25 +898,23 @@ def run_game_pvp(saved_state=None, human_symbol="X", game_settings=None):
                         stop_music()
                     pygame.quit()
                     sys.exit()
-                elif not game_over and not popup_active and not pause_active and hover_cell:
+                elif not popup_active and not pause_active and hover_cell:
                     x, y = hover_cell
-                    if board[y][x] == " ":
-                        board[y][x] = current_player
+                    if game.is_legal(x, y):
+                        won = game.play(x, y)
                         if game_settings.get("sfx", True):
                             play_sfx("place", game_settings)
-                        if check_win(x, y, current_player):
-                            players[current_player]["points"] += 1
-                            game_over = True
+                        if won:
+                            players[game.winner]["points"] += 1
                             popup_active = True
-                            winner = current_player
                             if game_settings.get("sfx", True):
                                 play_sfx("win", game_settings)
-                            
-                        else:
-                            current_player = "O" if current_player == "X" else "X"
 
-        pygame.display.flip()
-        clock.tick(60)
+        # left panel shows the player assigned to human_symbol for clarity
+        render_frame(mouse_pos, hover_cell, human_symbol, "O" if human_symbol == "X" else "X")
+        # Sleep until input or the running clock's next second
+        running_clock = not game.game_over and not popup_active and not pause_active
+        present_frame(clock, clock_timeout(game.current_player if running_clock else None))
 
 
 import pygame
@@ -644,7 +930,7 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
     - Client connects and starts once connected
     """
     import socket, threading, time
-    global board, current_player, game_over, popup_active, pause_active, winner
+    global game, popup_active, pause_active
 
     if game_settings is None:
         game_settings = {"sfx": True, "music": True}
@@ -692,6 +978,8 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
             connected = True
         except Exception as e:
             print(f"[NETWORK THREAD ERROR] {e}")
+        finally:
+            post_event(NETWORK_EVENT)  # wake the lobby screen
 
     def on_name_received(name):
         nonlocal opponent_name, name_received
@@ -704,6 +992,7 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
         nonlocal opponent_pressed_continue
         opponent_pressed_continue = True
         print("[GAME] Opponent pressed continue!")
+        post_event(NETWORK_EVENT)
 
     # Disconnect callback
     def on_disconnect(reason):
@@ -712,6 +1001,7 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
         disconnect_reason = reason
         disconnect_time = time.time()
         print(f"[NETWORK] Disconnected: {reason}")
+        post_event(NETWORK_EVENT)
 
     net.name_callback = on_name_received
     net.continue_callback = on_continue_received  
@@ -728,7 +1018,7 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
         small_font = pygame.font.SysFont("Arial", 28)
 
         while waiting:
-            for event in pygame.event.get():
+            for event in game_events():
                 if event.type == pygame.QUIT:
                     net.close()
                     pygame.quit()
@@ -750,9 +1040,12 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
             if connected or net.is_connected:
                 time.sleep(0.5)
                 net.send_name(username)
+                # The host's board size and win length are used by both sides
+                net.send_config(game_settings.get("board_size", 15), game_settings.get("win_length", WIN_CONSEC))
                 waiting = False
+                break
 
-            clock.tick(30)
+            wait_for_event()  # input, or NETWORK_EVENT once connected
 
     else:
         # --- Client mode ---
@@ -769,7 +1062,7 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
             screen.blit(cancel_text, cancel_text.get_rect(center=(400, 360)))
             pygame.display.flip()
 
-            for event in pygame.event.get():
+            for event in game_events():
                 if event.type == pygame.QUIT:
                     net.close()
                     pygame.quit()
@@ -784,33 +1077,38 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
                 sent_name = True
                 break
 
-            clock.tick(30)
+            wait_for_event()  # input, or NETWORK_EVENT once connected
 
     # Wait a moment for name exchange
     print("[GAME] Waiting for name exchange...")
     wait_start = time.time()
-    while not name_received and (time.time() - wait_start < 3):
+    while (not name_received or (not is_host and net.game_config is None)) and (time.time() - wait_start < 3):
         time.sleep(0.1)
     
     if not name_received:
         print("[GAME] Name exchange timeout, using default name")
         opponent_name = "Opponent"
 
+    if is_host:
+        set_board_size(game_settings.get("board_size", 15), game_settings.get("win_length", WIN_CONSEC))
+    elif net.game_config is not None:
+        set_board_size(net.game_config["size"], net.game_config["win_length"])
+    else:
+        print("[GAME] No game config from the host, using the standard board")
+        set_board_size()
+    screen = pygame.display.get_surface()
+
     # --- Connected! Start the online game ---
     print("[GAME] Both players connected! Starting game...")
     print(f"[GAME] Your name: {username}")
     print(f"[GAME] Opponent's name: {opponent_name}")
     
     # Initialize game state
-    board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-    current_player = "X"
     start_symbol = "X"
-    game_over = False
+    game = GameState(BOARD_SIZE, WIN_LENGTH, first=start_symbol)
+    net.game = game  # the network layer drops moves this game rejects
     popup_active = False
     pause_active = False
-    winner = None
-    players["X"]["time_left"] = 300
-    players["O"]["time_left"] = 300
 
     # music
     if game_settings.get("music", True):
@@ -839,29 +1137,27 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
     
     def on_move_received(move):
         """Callback when opponent moves."""
-        global current_player, game_over, winner, popup_active
+        global popup_active
         nonlocal my_turn
         try:
             x, y = move["x"], move["y"]
             
-            if board[y][x] != ' ':
+            try:
+                won = game.play(x, y, opponent_symbol)
+            except ValueError:
                 print(f"[ERROR] Opponent tried invalid move at ({x}, {y})")
                 return
             
-            board[y][x] = opponent_symbol
             play_sfx("place", game_settings)
             print(f"[GAME] Opponent placed {opponent_symbol} at ({x}, {y})")
             
-            if check_win(x, y, opponent_symbol):
-                game_over = True
+            if won:
                 popup_active = True
-                winner = opponent_symbol
                 print(f"[GAME] {opponent_symbol} wins!")
                 players[opponent_symbol]["points"] += 1
                 if game_settings.get("sfx", True):
                     play_sfx("win", game_settings)
-            else:
-                current_player = my_symbol
+            elif not game.game_over:
                 my_turn = True
                 print(f"[GAME] Now it's your turn! my_turn={my_turn}")
                 
@@ -869,9 +1165,75 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
             print(f"[MOVE RECEIVED ERROR] {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            post_event(NETWORK_EVENT)  # wake the game loop to draw the move
 
     net.callback = on_move_received
 
+    reason_messages = {
+        "quit": "Opponent quit the game",
+        "exit_to_menu": "Opponent returned to menu",
+        "return_to_menu": "Opponent returned to menu",
+        "connection_reset": "Connection lost",
+        "connection_aborted": "Connection aborted",
+        "connection_closed": "Connection closed",
+        "error": "Connection error",
+        "opponent_disconnected": "Opponent left the game"
+    }
+
+    def online_overlay_view():
+        """What the online overlay shows (None when there is none), for render_frame."""
+        if opponent_disconnected:
+            remaining = None
+            if disconnect_time:
+                remaining = round(max(0, auto_return_delay - (time.time() - disconnect_time)), 1)
+            return ("disconnected", disconnect_reason, remaining)
+        if popup_active and waiting_for_opponent:
+            return ("waiting",)
+        return None
+
+    def draw_online_overlay(view):
+        if view[0] == "waiting":
+            # Show waiting message if player pressed continue
+            waiting_font = pygame.font.SysFont("Arial", 28, bold=True)
+            waiting_text = waiting_font.render("Waiting for opponent...", True, (50, 50, 150))
+            waiting_rect = waiting_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 120))
+            
+            # Draw semi-transparent background for text
+            bg_rect = waiting_rect.inflate(40, 20)
+            s = pygame.Surface((bg_rect.width, bg_rect.height))
+            s.set_alpha(200)
+            s.fill((255, 255, 255))
+            screen.blit(s, bg_rect.topleft)
+            
+            screen.blit(waiting_text, waiting_rect)
+            return
+
+        _, reason, remaining = view
+        # Draw semi-transparent overlay
+        overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        overlay.set_alpha(200)
+        overlay.fill((0, 0, 0))
+        screen.blit(overlay, (0, 0))
+        
+        # Draw disconnect message
+        disconnect_font = pygame.font.SysFont("Arial", 44, bold=True)
+        medium_font = pygame.font.SysFont("Arial", 28)
+        small_font = pygame.font.SysFont("Arial", 22)
+        
+        disconnect_text = disconnect_font.render("Opponent Disconnected", True, (255, 100, 100))
+        screen.blit(disconnect_text, disconnect_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 60)))
+        reason_text = medium_font.render(reason_messages.get(reason, "Connection lost"), True, (220, 220, 220))
+        screen.blit(reason_text, reason_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2)))
+        
+        if remaining is not None:
+            returning = f"Returning to menu in {remaining:.1f}s..." if remaining > 0 else "Returning to menu..."
+            returning_text = medium_font.render(returning, True, (180, 180, 255))
+            screen.blit(returning_text, returning_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 60)))
+        
+        instruction_text = small_font.render("Press ESC to return immediately", True, (150, 150, 150))
+        screen.blit(instruction_text, instruction_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 110)))
+
     # --- Main online game loop ---
     running = True
     
@@ -897,14 +1259,9 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
             pygame.mixer.music.unpause()
 
         # --- Timer countdown for current player ---
-        if not game_over and not popup_active and not pause_active and not opponent_disconnected:
-            if current_player in players:
-                players[current_player]["time_left"] = max(0, players[current_player]["time_left"] - dt)
-                if players[current_player]["time_left"] <= 0:
-                    game_over = True
-                    popup_active = True
-                    winner = "O" if current_player == "X" else "X"
-                    players[winner]["points"] += 1
+        if not popup_active and not pause_active and not opponent_disconnected and game.tick(dt):
+            popup_active = True
+            players[game.winner]["points"] += 1
 
         # --- Draw UI ---
         mouse_pos = pygame.mouse.get_pos()
@@ -914,34 +1271,11 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
                 hover_cell = ((mouse_pos[0] - SIDE_PANEL_WIDTH) // CELL_SIZE,
                             (mouse_pos[1] - TOP_UI_HEIGHT) // CELL_SIZE)
 
-        screen.fill(BG_COLOR)
-        pause_rect, exit_rect = draw_top_ui(mouse_pos)
-        draw_player_panel("left", "X")
-        draw_player_panel("right", "O")
-        draw_board(hover_cell)
+        pause_rect, exit_rect = top_ui_rects()
+        continue_rect = popup_button_rect()
+        cont_rect, menu_rect = pause_popup_rects()
 
-        if popup_active and not opponent_disconnected:
-            continue_rect = show_popup(winner)
-            
-            # Show waiting message if player pressed continue
-            if waiting_for_opponent:
-                waiting_font = pygame.font.SysFont("Arial", 28, bold=True)
-                waiting_text = waiting_font.render("Waiting for opponent...", True, (50, 50, 150))
-                waiting_rect = waiting_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 120))
-                
-                # Draw semi-transparent background for text
-                bg_rect = waiting_rect.inflate(40, 20)
-                s = pygame.Surface((bg_rect.width, bg_rect.height))
-                s.set_alpha(200)
-                s.fill((255, 255, 255))
-                screen.blit(s, bg_rect.topleft)
-                
-                screen.blit(waiting_text, waiting_rect)
-                
-        elif pause_active and not opponent_disconnected:
-            cont_rect, menu_rect = show_pause_popup()
-
-        for event in pygame.event.get():
+        for event in game_events():
             if event.type == pygame.QUIT:
                 if net.is_connected:
                     net.send_disconnect("quit")
@@ -973,15 +1307,10 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
                             if opponent_pressed_continue:
                                 print("[GAME] Both players ready, restarting game...")
                                 # Reset game
-                                board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-                                start_symbol = "O" if start_symbol == "X" else "X"
-                                current_player = start_symbol
-                                my_turn = (my_symbol == current_player)
-                                game_over = False
+                                start_symbol = other(start_symbol)
+                                game.reset(start_symbol)
+                                my_turn = (my_symbol == game.current_player)
                                 popup_active = False
-                                winner = None
-                                players["X"]["time_left"] = 300
-                                players["O"]["time_left"] = 300
                                 i_pressed_continue = False
                                 opponent_pressed_continue = False
                                 waiting_for_opponent = False
@@ -1001,19 +1330,17 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
                             net.send_disconnect("return_to_menu")
                         net.close()
                         saved_state = {
-                            "board": [row[:] for row in board],
-                            "current_player": current_player,
+                            "game": game.copy(),
                             "players": {p: data.copy() for p, data in players.items()},
-                            "game_over": game_over,
                         }
                         return ("menu", saved_state)
                     
-                elif event.type == pygame.MOUSEBUTTONDOWN and not game_over:
+                elif event.type == pygame.MOUSEBUTTONDOWN and not game.game_over:
                     if my_turn and hover_cell is not None:
                         x, y = hover_cell
-                        if board[y][x] == ' ':
+                        if game.is_legal(x, y):
                             # Make the move
-                            board[y][x] = my_symbol
+                            won = game.play(x, y, my_symbol)
                             if game_settings.get("sfx", True):
                                 play_sfx("place", game_settings)
                             print(f"[GAME] You placed {my_symbol} at ({x}, {y})")
@@ -1022,16 +1349,13 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
                             net.send_move(x, y)
                             
                             # Check win
-                            if check_win(x, y, my_symbol):
-                                players[current_player]["points"] += 1
-                                game_over = True
+                            if won:
+                                players[my_symbol]["points"] += 1
                                 popup_active = True
-                                winner = my_symbol
                                 if game_settings.get("sfx", True):
                                     play_sfx("win", game_settings)
                                 print(f"[GAME] You win!")
                             else:
-                                current_player = opponent_symbol
                                 my_turn = False
                                 print(f"[GAME] Switched to opponent's turn. my_turn={my_turn}")
                     elif pause_rect.collidepoint(event.pos):
@@ -1050,86 +1374,25 @@ def play_online(is_host=False, host_ip=None, username=None, game_settings=None):
             if waiting_for_opponent and opponent_pressed_continue:
                 print("[GAME] Both players ready, restarting game...")
                 # Reset game
-                board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-                start_symbol = "O" if start_symbol == "X" else "X"
-                current_player = start_symbol
-                my_turn = (my_symbol == current_player)
-                game_over = False
+                start_symbol = other(start_symbol)
+                game.reset(start_symbol)
+                my_turn = (my_symbol == game.current_player)
                 popup_active = False
-                winner = None
-                players["X"]["time_left"] = 300
-                players["O"]["time_left"] = 300
                 i_pressed_continue = False
                 opponent_pressed_continue = False
                 waiting_for_opponent = False
 
+        footer = None if opponent_disconnected else (f"Connected to {host_ip}" if not is_host else f"Hosting on {host_ip}")
+        overlay_view = online_overlay_view()
+        render_frame(mouse_pos, hover_cell, "X", "O", footer=footer, popups=not opponent_disconnected,
+                     overlay=(overlay_view, lambda: draw_online_overlay(overlay_view)) if overlay_view else None)
+        # Sleep until input, a network message or the running clock's next second
         if opponent_disconnected:
-            # Draw semi-transparent overlay
-            overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-            overlay.set_alpha(200)
-            overlay.fill((0, 0, 0))
-            screen.blit(overlay, (0, 0))
-            
-            # Draw disconnect message
-            disconnect_font = pygame.font.SysFont("Arial", 44, bold=True)
-            medium_font = pygame.font.SysFont("Arial", 28)
-            small_font = pygame.font.SysFont("Arial", 22)
-            
-            disconnect_text = disconnect_font.render("Opponent Disconnected", True, (255, 100, 100))
-            disconnect_rect = disconnect_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 60))
-            
-            reason_messages = {
-                "quit": "Opponent quit the game",
-                "exit_to_menu": "Opponent returned to menu",
-                "return_to_menu": "Opponent returned to menu",
-                "connection_reset": "Connection lost",
-                "connection_aborted": "Connection aborted",
-                "connection_closed": "Connection closed",
-                "error": "Connection error",
-                "opponent_disconnected": "Opponent left the game"
-            }
-            reason_text = medium_font.render(
-                reason_messages.get(disconnect_reason, "Connection lost"),
-                True, (220, 220, 220)
-            )
-            reason_rect = reason_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2))
-            
-            # ✅ Calculate time remaining
-            if disconnect_time:
-                elapsed = time.time() - disconnect_time
-                remaining = max(0, auto_return_delay - elapsed)
-                
-                if remaining > 0:
-                    returning_text = medium_font.render(
-                        f"Returning to menu in {remaining:.1f}s...",
-                        True, (180, 180, 255)
-                    )
-                else:
-                    returning_text = medium_font.render(
-                        "Returning to menu...",
-                        True, (180, 180, 255)
-                    )
-                returning_rect = returning_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 60))
-            
-            instruction_text = small_font.render("Press ESC to return immediately", True, (150, 150, 150))
-            instruction_rect = instruction_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 110))
-            
-            screen.blit(disconnect_text, disconnect_rect)
-            screen.blit(reason_text, reason_rect)
-            if disconnect_time:
-                screen.blit(returning_text, returning_rect)
-            screen.blit(instruction_text, instruction_rect)
+            timeout = 100  # the countdown to the menu shows tenths of a second
         else:
-            # Draw connection status
-            small_font = pygame.font.SysFont("Arial", 18)
-            status_text = small_font.render(
-                f"Connected to {host_ip}" if not is_host else f"Hosting on {host_ip}",
-                True, (100, 100, 100)
-            )
-            screen.blit(status_text, (30, WINDOW_HEIGHT - 30))
-
-        pygame.display.flip()
-        clock.tick(60)
+            running_clock = not game.game_over and not popup_active and not pause_active
+            timeout = clock_timeout(game.current_player if running_clock else None)
+        present_frame(clock, timeout)
 
     net.close()
     print("[GAME] Game ended, connection closed")
@@ -0,0 +1,81 @@
+"""
+Bounded transposition table for the AI search.
+
+Positions are keyed by the 64-bit Zobrist hash kept up to date by BitBoard.
+Each bucket has two slots: a depth-preferred slot that keeps the deepest
+result seen for the bucket, and an always-replace slot that takes whatever
+was stored last. The number of buckets is derived from a memory cap.
+"""
+
+# Bound types
+EXACT = 0
+LOWER = 1  # score is a lower bound (search failed high)
+UPPER = 2  # score is an upper bound (search failed low)
+
+# Rough size of one stored entry (tuple + key/score objects) plus its list slot
+ENTRY_BYTES = 176
+
+DEFAULT_MEMORY_MB = 64
+
+
+class TranspositionTable:
+    """Two-tier (depth-preferred + always-replace) hash table with a memory cap."""
+
+    def __init__(self, max_mb=DEFAULT_MEMORY_MB):
+        # Player whose point of view the stored scores use; callers clear the
+        # table when it changes
+        self.owner = None
+        self.resize(max_mb)
+
+    def resize(self, max_mb):
+        """Reallocate the table for a new memory cap (drops all entries)."""
+        self.max_mb = max_mb
+        buckets = max(1, int(max_mb * 1024 * 1024) // (2 * ENTRY_BYTES))
+        # Round down to a power of two so the bucket is just key & mask
+        self.size = 1 << (buckets.bit_length() - 1)
+        self._mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        """Forget every stored position."""
+        self._deep = [None] * self.size
+        self._recent = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Mark the start of a new root search so older deep entries can be replaced."""
+        self.generation += 1
+
+    def probe(self, key):
+        """Return (depth, score, bound, move) stored for key, or None."""
+        self.probes += 1
+        slot = key & self._mask
+        entry = self._deep[slot]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:5]
+        entry = self._recent[slot]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:5]
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """Record a search result; deeper (or newer-search) results win the depth slot."""
+        self.stores += 1
+        slot = key & self._mask
+        entry = (key, depth, score, bound, move, self.generation)
+        deep = self._deep[slot]
+        if deep is None or deep[0] == key or depth >= deep[1] or deep[5] != self.generation:
+            # Demote the displaced deep entry so it still gets a chance to be hit
+            if deep is not None and deep[0] != key:
+                self._recent[slot] = deep
+            self._deep[slot] = entry
+        else:
+            self._recent[slot] = entry
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
@@ -0,0 +1,226 @@
+"""
+Vectorized board evaluation with NumPy, for scoring many positions at once.
+
+A position is an int8 array (0 empty, 1 X, 2 O), padded with walls (3) so
+every 9-cell window stays on the array. For each of the four directions the
+window code of every cell (two bits per cell, as in patterns.py) is built
+from 9 shifted views of the padded array, and one PATTERN_TABLE lookup over
+the whole array gives every stone's threat class for both players.
+
+For the score, every row, column and diagonal is gathered into one array of
+lines and scanned cell by cell (for all lines and positions at once), grouping
+stones the way patterns.evaluate_line_fast does: each group counts once, with
+its strongest class. The totals are the bitboard's running scores, threats
+and fives, so the score is exactly evaluate_board's (`python vector_eval.py`
+checks this on random positions).
+
+The search itself uses the bitboard's O(1) running totals; this evaluator
+is for callers that score a batch of positions in one call, where NumPy's
+per-call overhead is shared: ordering the moves at the root of a position,
+and analysis for the opening book and self-play. NumPy is optional; check
+HAS_NUMPY before calling.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # the game and the search run without it
+    np = None
+
+import ai
+from patterns import WIN_CONSEC, CLASS_SCORES, CELL_WALL, FIVE, OPEN_THREE, get_patterns
+from bitboard import DIRECTIONS, get_geometry
+
+HAS_NUMPY = np is not None
+
+# PATTERN_TABLE as a NumPy array, per win length
+_tables = {}
+# Cell index of every line position (walls included), per (size, win length)
+_line_cells = {}
+
+if HAS_NUMPY:
+    # Score, threat and five count of a group of each class (see patterns.evaluate_line_fast)
+    _GROUP_VALUES = np.array([(score, OPEN_THREE <= c < FIVE, c == FIVE)
+                              for c, score in enumerate(CLASS_SCORES)], dtype=np.int64)
+
+
+def board_array(board):
+    """The position of a BitBoard as a (size, size) int8 array."""
+    return np.array(board.cells, dtype=np.int8).reshape(board.size, board.size)
+
+
+def _table(win_length):
+    table = _tables.get(win_length)
+    if table is None:
+        table = _tables[win_length] = np.array(get_patterns(win_length)["table"], dtype=np.uint8)
+    return table
+
+
+def _lines(size, win_length):
+    """
+    Index arrays of shape (lines, size): the cell at every position of every line of
+    the board, and that cell's slot in the (cell, direction) pattern array. Lines
+    shorter than the board are padded with the wall index (size * size, resp. size * size * 4).
+    """
+    lines = _line_cells.get((size, win_length))
+    if lines is None:
+        geometry = get_geometry(size, win_length)
+        cells = np.full((len(geometry["line_lengths"]), size), size * size, dtype=np.intp)
+        slots = np.full(cells.shape, size * size * 4, dtype=np.intp)
+        for idx, cell_lines in enumerate(geometry["cell_lines"]):
+            for direction, (line_id, pos, _, _, _) in enumerate(cell_lines):
+                cells[line_id, pos] = idx
+                slots[line_id, pos] = idx * 4 + direction
+        lines = _line_cells[size, win_length] = (cells, slots)
+    return lines
+
+
+def _stone_classes(boards, win_length):
+    """PATTERN_TABLE entry of every (cell, direction) of a (batch, size, size) array: (batch, size * size * 4)."""
+    size = boards.shape[-1]
+    table = _table(win_length)
+    half_window = win_length - 1
+    padded = np.pad(boards, [(0, 0), (half_window, half_window), (half_window, half_window)], constant_values=CELL_WALL)
+    return np.stack([table[_window_codes(padded, size, half_window, dx, dy)] for dx, dy in DIRECTIONS],
+                    axis=-1).reshape(boards.shape[0], -1)
+
+
+def line_totals(boards, win_length=WIN_CONSEC):
+    """
+    Pattern totals of one or more positions, summed over every line: an int array of
+    shape (..., 2, 3) holding (score, threats, fives) for X then O, the same figures
+    as a BitBoard's scores, threats and fives.
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    size = boards.shape[-1]
+    batch = boards.reshape(-1, size, size)
+    count = batch.shape[0]
+    line_cells, line_slots = _lines(size, win_length)
+
+    flat = batch.reshape(count, -1)
+    cells = np.concatenate([flat, np.full((count, 1), CELL_WALL, dtype=np.int8)], axis=1)[:, line_cells]
+    entries = _stone_classes(batch, win_length)
+    entries = np.concatenate([entries, np.zeros((count, 1), dtype=entries.dtype)], axis=1)[:, line_slots]
+
+    # Axis 0 is X then O; each line runs along the last axis
+    own = np.stack([cells == 1, cells == 2])
+    classes = np.stack([entries & 15, entries >> 4])
+    before = np.zeros(own.shape[:-1] + (1,), dtype=bool)
+    own_1 = np.concatenate([before, own[..., :-1]], axis=-1)               # own stone one cell back
+    own_2 = np.concatenate([before, before, own[..., :-2]], axis=-1)       # own stone two cells back
+    empty_1 = np.concatenate([before[0], cells[..., :-1] == 0], axis=-1)   # empty cell one back
+    # A stone joins the group of an own stone next to it, or one cell further across a gap
+    starts = own & ~(own_1 | (empty_1 & own_2))
+
+    # Each group's class is the strongest of its stones: a segmented max over the stones in line order
+    stones = np.flatnonzero(own)
+    if not stones.size:
+        return np.zeros(boards.shape[:-2] + (2, 3), dtype=np.int64)
+    group_starts = np.flatnonzero(starts.ravel()[stones])
+    group_classes = np.maximum.reduceat(classes.ravel()[stones], group_starts)
+    group_owner = stones[group_starts] // own[0, 0].size  # player * count + position in the batch
+    counts = np.bincount(group_owner * 9 + group_classes, minlength=2 * count * 9).reshape(2, count, 9)
+    totals = (counts @ _GROUP_VALUES).transpose(1, 0, 2)
+    return totals.reshape(boards.shape[:-2] + (2, 3))
+
+
+def _window_codes(padded, size, half_window, dx, dy):
+    """Window code of every cell in one direction; padded has half_window walls on every side."""
+    codes = np.zeros(padded.shape[:-2] + (size, size), dtype=np.int32)
+    for p in range(2 * half_window + 1):
+        offset = p - half_window
+        y0 = half_window + offset * dy
+        x0 = half_window + offset * dx
+        codes |= padded[..., y0:y0 + size, x0:x0 + size].astype(np.int32) << (2 * p)
+    return codes
+
+
+def pattern_counts(boards, win_length=WIN_CONSEC):
+    """
+    Threat-class counts of both players' stones for one or more positions.
+    boards has shape (..., size, size); returns an int array of shape
+    (..., 2, 9): stones of X then O in each class, summed over the 4 directions.
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    size = boards.shape[-1]
+    batch = boards.reshape(-1, size, size)
+    entries = _stone_classes(batch, win_length).reshape(batch.shape[0], size * size, 4)
+    cells = batch.reshape(batch.shape[0], size * size, 1)
+    counts = np.zeros((batch.shape[0], 2, 9), dtype=np.int64)
+    rows = np.arange(batch.shape[0])[:, None, None]
+
+    for player, (stone, classes) in enumerate(((1, entries & 15), (2, entries >> 4))):
+        # A stone's entry only carries its owner's class; ignore empty cells' potential
+        flat = np.where(cells == stone, rows * 9 + classes, -1).ravel()
+        flat = flat[flat >= 0]
+        counts[:, player] = np.bincount(flat, minlength=batch.shape[0] * 9).reshape(-1, 9)
+    return counts.reshape(boards.shape[:-2] + (2, 9))
+
+
+def score_totals(totals, ai_stone, human_stone):
+    """evaluate_board's score (for ai_stone) from line_totals output."""
+    totals = np.asarray(totals)
+    scores, threats, fives = totals[..., 0], totals[..., 1], totals[..., 2]
+    ai_index, human_index = ai_stone - 1, human_stone - 1
+    # Same multi-threat bonus and defence weight as evaluate_board (read at call time, see selfplay.py)
+    player_score = scores + np.where(threats >= 2, ai.MULTI_THREAT_BONUS, 0)
+    result = player_score[..., ai_index] - player_score[..., human_index] * ai.DEFENSE_WEIGHT
+    result = np.where(fives[..., human_index] > 0, -10000000, result)
+    return np.where(fives[..., ai_index] > 0, 10000000, result)
+
+
+def evaluate_boards(boards, ai_stone, human_stone, win_length=WIN_CONSEC):
+    """Scores of one or more positions (array of shape (..., size, size)) for ai_stone."""
+    return score_totals(line_totals(boards, win_length), ai_stone, human_stone)
+
+
+def score_children(board, moves, player, ai_stone, human_stone):
+    """
+    Scores (for ai_stone) of the positions after player plays each of moves
+    (cell indices) on board, evaluated as one batch.
+    """
+    base = np.array(board.cells, dtype=np.int8)
+    children = np.repeat(base[None, :], len(moves), axis=0)
+    children[np.arange(len(moves)), moves] = player
+    return evaluate_boards(children.reshape(-1, board.size, board.size), ai_stone, human_stone, board.win_length)
+
+
+def order_moves_batch(board, player, opponent, max_moves=15):
+    """
+    Candidate moves for player, best first, by the evaluation of every child
+    position in one batch. Like ai.order_moves, returns the centre on an empty board.
+    """
+    moves = sorted(board.candidates)
+    if not moves:
+        centre = board.size // 2
+        return [board.index(centre, centre)]
+    scores = score_children(board, moves, player, player, opponent)
+    best = np.argsort(-scores, kind="stable")[:max_moves]
+    return [moves[i] for i in best]
+
+
+def check(positions=200, size=15, seed=1):
+    """
+    Compare evaluate_boards with ai.evaluate_board on random positions; returns the
+    number that differ (0 expected).
+    """
+    import random
+    from bitboard import BitBoard
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(positions):
+        board = BitBoard(size)
+        for i, idx in enumerate(rng.sample(range(size * size), rng.randrange(0, 60))):
+            board.make(idx, 1 + i % 2)
+        ai_stone = rng.choice((1, 2))
+        expected = ai.evaluate_board(board, ai_stone, 3 - ai_stone)
+        got = evaluate_boards(board_array(board), ai_stone, 3 - ai_stone)
+        if got != expected:
+            mismatches += 1
+            print(f"mismatch: {got} != {expected}  {[board.coords(i) for i in board.history]}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    if not HAS_NUMPY:
+        raise SystemExit("vector_eval needs NumPy")
+    print(f"{check()} of 200 positions differ from evaluate_board")